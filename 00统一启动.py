@@ -0,0 +1,229 @@
+# 统一启动入口：按模式只加载对应的后端脚本，所有串口并行打开，虚拟手柄与端口准备并行创建
+#
+#   python 00统一启动.py xbox COM3 COM4     每个串口一个虚拟 Xbox（04 脚本）
+#   python 00统一启动.py ds4 COM11          串口 -> 虚拟 DS4（02PS 脚本）
+#   python 00统一启动.py hotplug            监控串口热插拔（03 脚本）
+#
+# 可选参数：
+#   --baud 115200              固定波特率（默认自动检测，ds4 模式默认 115200）
+#   --dashboard                实时面板
+#   --json                     以 JSON 输出启动耗时（基准测试用）
+#   --exit-after-first-frame   第一帧生效后打印启动耗时并退出（基准测试用）
+#
+# 启动耗时：导入后端、打开全部端口、自进程启动到第一帧生效。
+import time
+
+T0 = time.monotonic()
+
+import argparse
+import asyncio
+import glob
+import importlib.util
+import json
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# asyncio 只保留任务的弱引用，后台任务放在这里防止被回收
+background_tasks = set()
+
+BACKENDS = {
+    "xbox": "04*.py",
+    "ds4": "02PS*.py",
+    "hotplug": "03*.py",
+}
+
+
+def spawn(coro):
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def load_backend(mode):
+    """
+    只导入所选模式的脚本（以及它依赖的 vgamepad / serial_asyncio 等）。
+    """
+    path = glob.glob(os.path.join(HERE, BACKENDS[mode]))[0]
+    spec = importlib.util.spec_from_file_location(f"meps2_backend_{mode}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def wait_first_frame(protocols):
+    """
+    等到任意一个端口的第一帧生效，返回其时间 (time.monotonic)。
+    :param protocols: 返回当前协议对象列表的函数
+    """
+    while True:
+        stamps = [p.backlog.first_frame_time for p in protocols() if p.backlog.first_frame_time]
+        if stamps:
+            return min(stamps)
+        await asyncio.sleep(0.005)
+
+
+async def start_xbox(backend, args, dashboard, streamer):
+    loop = asyncio.get_running_loop()
+    calibration = backend.CalibrationStore() if backend.CALIBRATION else None
+    cache = backend.baud_cache()
+
+    # 虚拟手柄在线程池中创建，与波特率检测、端口打开同时进行
+    pads = [loop.run_in_executor(None, backend.vg.VX360Gamepad) for _ in args.ports]
+    # 打不开的端口返回 None（已打印原因），其余端口照常运行
+    protocols = await asyncio.gather(*(
+        backend.open_handpad(port, streamer, calibration, cache, dashboard, pad)
+        for port, pad in zip(args.ports, pads)
+    ))
+    protocols = [p for p in protocols if p is not None]
+    return lambda: protocols
+
+
+async def start_ds4(backend, args, dashboard, streamer):
+    import serial
+    loop = asyncio.get_running_loop()
+    baudrate = args.baud or 115200
+    calibration = backend.CalibrationStore() if backend.CALIBRATION else None
+
+    async def open_one(port):
+        # 串口、虚拟手柄和设备指纹都是阻塞调用，分别放到线程池里同时进行
+        ser, pad, fingerprint = results = await asyncio.gather(
+            loop.run_in_executor(None, lambda: serial.serial_for_url(port, baudrate=baudrate)),
+            loop.run_in_executor(None, backend.vg.VDS4Gamepad),
+            loop.run_in_executor(None, backend.lookup_fingerprint, port),
+            return_exceptions=True,
+        )
+        try:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+            transport, protocol = await backend.serial_asyncio.connection_for_serial(
+                loop, lambda: backend.MePS2Protocol(pad=pad, calibration=calibration, fingerprint=fingerprint), ser
+            )
+        except Exception as e:
+            # 已经打开的串口要关掉；虚拟手柄不再引用，回收时自动拔出
+            print(f"❌ 无法打开 {port}: {e}")
+            if not isinstance(ser, Exception):
+                ser.close()
+            return None
+        return protocol
+
+    # 打不开的端口返回 None（已打印原因），其余端口照常运行
+    protocols = await asyncio.gather(*(open_one(port) for port in args.ports))
+    protocols = [p for p in protocols if p is not None]
+    return lambda: protocols
+
+
+async def start_hotplug(backend, args, dashboard, streamer):
+    loop = asyncio.get_running_loop()
+
+    # 预热的虚拟手柄与第一次端口扫描同时进行
+    pool = backend.PadPool(size=0)
+    manager = backend.GamepadManager(streamer, pool=pool, dashboard=dashboard)
+    ports, pads = await asyncio.gather(
+        manager.scan_ports(),
+        asyncio.gather(*(loop.run_in_executor(None, pool.factory) for _ in range(backend.PAD_POOL_SIZE))),
+    )
+    pool.free.extend(pads)
+    await manager.sync_ports(ports)
+
+    spawn(manager.manage_hotplug())
+    return lambda: [protocol for transport, protocol in manager.active_ports.values()]
+
+
+STARTERS = {
+    "xbox": start_xbox,
+    "ds4": start_ds4,
+    "hotplug": start_hotplug,
+}
+
+
+def print_report(report, as_json):
+    if as_json:
+        print(json.dumps(report), flush=True)
+        return
+    first = report.get("first_input")
+    print(f"⏱ 导入后端 {report['import'] * 1000:.0f} ms，打开端口 {report['open'] * 1000:.0f} ms，"
+          f"首次输入 {'-' if first is None else f'{first * 1000:.0f}'} ms（自进程启动）", flush=True)
+
+
+async def main(args):
+    report = {}
+
+    t = time.monotonic()
+    backend = load_backend(args.mode)
+    report["import"] = time.monotonic() - t
+
+    if args.baud and hasattr(backend, "AUTO_BAUD"):
+        backend.AUTO_BAUD = False
+        backend.BAUDRATE = args.baud
+
+    dashboard = None
+    if args.dashboard:
+        from meps2_dashboard import Dashboard
+        dashboard = Dashboard()
+
+    # numpy 导入较慢，在线程里与端口打开同时完成
+    if getattr(backend, "CALIBRATION", False):
+        from meps2_calib import load_numpy
+        spawn(asyncio.get_running_loop().run_in_executor(None, load_numpy))
+
+    streamer = None
+    if getattr(backend, "STREAM_BIND", None) is not None:
+        streamer = backend.FrameStreamer(backend.STREAM_BIND)
+    try:
+        await run(backend, args, dashboard, streamer, report)
+    finally:
+        if streamer is not None:
+            streamer.close()
+
+
+async def run(backend, args, dashboard, streamer, report):
+    t = time.monotonic()
+    protocols = await STARTERS[args.mode](backend, args, dashboard, streamer)
+    report["open"] = time.monotonic() - t
+    opened = len(protocols())
+    if args.ports and opened < len(args.ports):
+        print(f"⚠️ {opened}/{len(args.ports)} 个手柄已启动")
+    else:
+        print("🎉 所有手柄已启动，尽情游戏！")
+
+    async def report_first_frame():
+        report["first_input"] = await wait_first_frame(protocols) - T0
+        print_report(report, args.json)
+
+    try:
+        if args.exit_after_first_frame:
+            await report_first_frame()
+            return
+
+        spawn(report_first_frame())
+        if dashboard is not None:
+            dashboard.start()
+        while True:
+            await asyncio.sleep(1)
+    finally:
+        # 关闭端口：connection_lost 中保存摇杆校准、复位虚拟手柄
+        for protocol in protocols():
+            protocol.transport.close()
+        await asyncio.sleep(0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MePS2 手柄桥接统一启动入口")
+    parser.add_argument("mode", choices=sorted(BACKENDS))
+    parser.add_argument("ports", nargs="*", help="串口列表（hotplug 模式不需要）")
+    parser.add_argument("--baud", type=int, default=None)
+    parser.add_argument("--dashboard", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--exit-after-first-frame", action="store_true")
+    args = parser.parse_args()
+
+    if args.mode != "hotplug" and not args.ports:
+        parser.error("xbox / ds4 模式需要至少一个串口")
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        print("Exiting")
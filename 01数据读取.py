@@ -1,16 +1,56 @@
 
 import serial
+import sys
+import threading
 import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from meps2_autobaud import CANDIDATE_BAUDRATES, baud_cache, detect_baudrate
+from meps2_cache import lookup_fingerprint
+from meps2_dashboard import Dashboard, meps2_source
+from meps2_events import EdgeDetector, EventHub
+from meps2_frame import NEUTRAL, PS2_BUTTONS, FrameDecoder
+
+
+# 超过该秒数未收到数据时认为手柄断开，状态回到中值
+DATA_TIMEOUT = 0.2
+
+
+class PS2Snapshot(namedtuple('PS2Snapshot', ['seq', 'timestamp', 'data'])):
+    """
+    不可变的手柄状态快照。
+    seq: 帧序号；timestamp: 解析出该帧的时间 (time.monotonic)；data: 只读的 ps2_data_list
+    """
+    __slots__ = ()
+
+    def age(self):
+        """
+        距离该帧被解析出来经过的秒数。
+        """
+        return time.monotonic() - self.timestamp
+
 
 class MePS2:
-    def __init__(self, port='COM3', baudrate=9600):
+    def __init__(self, port='COM3', baudrate=None):
         """
         初始化串口和手柄状态。
         :param port: 串口号（如 'COM3')
-        :param baudrate: 波特率，默认 9600
+        :param baudrate: 波特率，默认 None 表示自动检测（检测失败时用 9600）
         """
-        self.serial = serial.Serial(port, baudrate, timeout=1)
-        self.buffer = [0] * 10  # 模拟 MePS2 的 buffer，9 字节数据 + 校验和
+        self.baud_result = None
+        if baudrate is None:
+            self.serial = serial.Serial(port, CANDIDATE_BAUDRATES[0], timeout=1)
+            self.baud_result = detect_baudrate(self.serial, lookup_fingerprint(port), cache=baud_cache())
+            if self.baud_result.baudrate is None:
+                print(f"{port} 未检测到 MePS2 数据，使用 9600")
+                self.serial.baudrate = 9600
+            else:
+                print(f"{port}: {self.baud_result.baudrate} bps，首帧 {self.baud_result.first_frame * 1000:.0f} ms")
+        else:
+            self.serial = serial.Serial(port, baudrate, timeout=1)
+        self.decoder = FrameDecoder()  # 代替 MePS2 的 buffer：边收边累加校验和
+        self.frame = NEUTRAL           # 最近一帧有效数据（不可变的 Frame）
         self.ps2_data_list = {
             'LX': 128, 'LY': 128, 'RX': 128, 'RY': 128,  # 摇杆默认中值
             'R1': False, 'R2': False, 'L1': False, 'L2': False,
@@ -21,11 +61,16 @@ class MePS2:
         }
         self.ps2_data_list_bak = self.ps2_data_list.copy()  # 备份状态
         self.is_ready = False
-        self.is_start = False
-        self.index = 0
-        self.prev_c = 0
         self.last_time = time.time()
 
+        # 边沿事件：self.events.subscribe() / add_callback() 订阅按下、松开和摇杆越过阈值
+        self.events = EventHub()
+        self.edges = EdgeDetector(port)
+
+        # 后台读取线程（可选，见 start_reader）
+        self.snapshot = PS2Snapshot(0, time.monotonic(), MappingProxyType(dict(self.ps2_data_list)))
+        self.reader_thread = None
+        self.reader_running = False
 
     def read_serial(self):
         """
@@ -42,48 +87,45 @@ class MePS2:
         """
         current_time = time.time()
         # 超时重置（200ms 未收到数据）
-        if current_time - self.last_time > 0.2:
-            self.is_ready = False
-            self.is_start = False
-            self.prev_c = 0x00
-            self.buffer[2] = self.buffer[4] = self.buffer[6] = self.buffer[8] = 0x80  # 摇杆中值
-            self.buffer[1] = self.buffer[3] = self.buffer[5] = self.buffer[7] = 0x00  # 按键清零
+        if current_time - self.last_time > DATA_TIMEOUT:
+            self.reset_state()
 
         data = self.read_serial()
         while data is not None:
             self.last_time = current_time
-            c = data & 0xFF
-            if c == 0x55 and not self.is_start and self.prev_c == 0xFF:
-                self.index = 1
-                self.is_start = True
-            else:
-                self.prev_c = c
-                if self.is_start:
-                    self.buffer[self.index] = c
-            self.index += 1
-
-            # 数据帧结束或错误处理
-            if not self.is_start and self.index > 12:
-                self.index = 0
-                self.is_start = False
-                self.buffer[2] = self.buffer[4] = self.buffer[6] = self.buffer[8] = 0x80
-                self.buffer[1] = self.buffer[3] = self.buffer[5] = self.buffer[7] = 0x00
-            elif self.is_start and self.index > 9:
-                # 校验和验证
-                checksum = sum(self.buffer[2:9]) & 0xFF
-                if checksum == self.buffer[9]:
-                    self.is_ready = True
-                    self.is_start = False
-                    self.index = 0
-                    return True
-                else:
-                    self.is_start = False
-                    self.index = 0
-                    self.prev_c = 0x00
-                    return False
+            result = self.parse_byte(data)
+            if result is not None:
+                return result
             data = self.read_serial()
         return False
 
+    def reset_state(self):
+        """
+        超时后丢弃半帧，摇杆回到中值、按键清零。
+        """
+        self.is_ready = False
+        self.decoder.reset()
+        self.frame = NEUTRAL
+
+    @property
+    def checksum_errors(self):
+        return self.decoder.checksum_errors
+
+    def parse_byte(self, data):
+        """
+        向解码器送入一个字节。
+        :return: True 收到有效帧,False 校验失败,None 帧未结束
+        """
+        errors = self.decoder.checksum_errors
+        frames = self.decoder.feed((data & 0xFF,))
+        if frames:
+            self.frame = frames[0]
+            self.is_ready = True
+            return True
+        if self.decoder.checksum_errors != errors:
+            return False
+        return None
+
     def me_analog(self, button):
         """
         读取摇杆模拟量，模拟 MePS2::MeAnalog。
@@ -117,38 +159,98 @@ class MePS2:
     def loop(self):
         """
         更新手柄状态，模拟 MePS2::loop。
+        后台读取线程运行时由线程负责更新，这里不再读串口。
         """
+        if self.reader_running:
+            return
         if self.read_joystick():
-            # 更新摇杆数据
-            self.ps2_data_list['LX'] = self.buffer[2]
-            self.ps2_data_list['LY'] = self.buffer[4]
-            self.ps2_data_list['RX'] = self.buffer[6]
-            self.ps2_data_list['RY'] = self.buffer[8]
-            # 更新按键数据
-            self.ps2_data_list['R1'] = (self.buffer[3] & 0x01) == 0x01
-            self.ps2_data_list['R2'] = (self.buffer[3] & 0x02) == 0x02
-            self.ps2_data_list['L1'] = (self.buffer[3] & 0x04) == 0x04
-            self.ps2_data_list['L2'] = (self.buffer[3] & 0x08) == 0x08
-            self.ps2_data_list['MODE'] = (self.buffer[3] & 0x10) == 0x10
-            self.ps2_data_list['TRIANGLE'] = (self.buffer[5] & 0x01) == 0x01
-            self.ps2_data_list['XSHAPED'] = (self.buffer[5] & 0x02) == 0x02
-            self.ps2_data_list['SQUARE'] = (self.buffer[5] & 0x04) == 0x04
-            self.ps2_data_list['ROUND'] = (self.buffer[5] & 0x08) == 0x08
-            self.ps2_data_list['START'] = (self.buffer[5] & 0x10) == 0x10
-            self.ps2_data_list['UP'] = (self.buffer[7] & 0x01) == 0x01
-            self.ps2_data_list['DOWN'] = (self.buffer[7] & 0x02) == 0x02
-            self.ps2_data_list['LEFT'] = (self.buffer[7] & 0x04) == 0x04
-            self.ps2_data_list['RIGHT'] = (self.buffer[7] & 0x08) == 0x08
-            self.ps2_data_list['SELECT'] = (self.buffer[7] & 0x10) == 0x10
-            self.ps2_data_list['BUTTON_L'] = (self.buffer[3] & 0x20) == 0x20
-            self.ps2_data_list['BUTTON_R'] = (self.buffer[7] & 0x20) == 0x20
-
-        
+            self.update_data()
+            self.events.publish(self.edges.feed(self.frame))
+
+    def update_data(self):
+        """
+        把最近一帧 self.frame 写入 ps2_data_list。
+        """
+        frame = self.frame
+        # 更新摇杆数据
+        self.ps2_data_list['LX'] = frame.lx
+        self.ps2_data_list['LY'] = frame.ly
+        self.ps2_data_list['RX'] = frame.rx
+        self.ps2_data_list['RY'] = frame.ry
+        # 更新按键数据
+        for name, bit in PS2_BUTTONS.items():
+            self.ps2_data_list[name] = (frame.buttons & bit) != 0
+
+    def start_reader(self):
+        """
+        启动后台读取线程。线程持续解码串口数据，每收到一帧就发布一个新的 PS2Snapshot。
+        应用侧通过 self.snapshot 一次属性访问拿到最新状态，无需加锁：
+        快照本身不可变，发布只是替换引用，读到的永远是一帧完整的数据。
+        """
+        if self.reader_thread is not None:
+            return
+        self.reader_running = True
+        self.reader_thread = threading.Thread(
+            target=self._reader_loop, name=f"MePS2-{self.serial.port}", daemon=True
+        )
+        self.reader_thread.start()
+
+    def stop_reader(self):
+        """
+        停止后台读取线程。
+        """
+        thread = self.reader_thread
+        if thread is None:
+            return
+        self.reader_running = False
+        thread.join(timeout=2)
+        self.reader_thread = None
+
+    def _reader_loop(self):
+        seq = self.snapshot.seq
+        # 缩短阻塞读的超时，断流后能及时回到中值
+        old_timeout = self.serial.timeout
+        self.serial.timeout = DATA_TIMEOUT / 4
+        while self.reader_running:
+            try:
+                # 有数据就整块读，没有数据时阻塞等待 1 字节（受串口 timeout 限制）
+                chunk = self.serial.read(self.serial.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError):
+                break
+            if not chunk:
+                if self.is_ready and time.time() - self.last_time > DATA_TIMEOUT:
+                    # 与 read_joystick 相同的超时重置，并发布中值快照（按住的键在订阅端松开）
+                    self.reset_state()
+                    self.update_data()
+                    seq += 1
+                    now = time.monotonic()
+                    self.snapshot = PS2Snapshot(seq, now, MappingProxyType(dict(self.ps2_data_list)))
+                    self.events.publish(self.edges.feed(NEUTRAL, now))
+                continue
+            self.last_time = time.time()
+            for frame in self.decoder.feed(chunk):
+                self.frame = frame
+                self.is_ready = True
+                self.update_data()
+                seq += 1
+                now = time.monotonic()
+                self.snapshot = PS2Snapshot(seq, now, MappingProxyType(dict(self.ps2_data_list)))
+                self.events.publish(self.edges.feed(frame, now))
+        self.reader_running = False
+        try:
+            self.serial.timeout = old_timeout
+        except (serial.SerialException, OSError, ValueError):
+            pass
+        # 串口出错退出时也清除，之后可以重新 start_reader
+        if self.reader_thread is threading.current_thread():
+            self.reader_thread = None
 
     def close(self):
         """
         关闭串口连接。
         """
+        self.stop_reader()
+        self.events.close()
         self.serial.close()
 
 # 测试代码
@@ -156,6 +258,38 @@ if __name__ == "__main__":
     ps2_a = MePS2(port='COM3', baudrate=115200)  # 替换为你的串口号
     ps2_b = MePS2(port='COM4', baudrate=115200)  # 替换为你的串口号
     ps2=[ps2_a,ps2_b]
+
+    # --dashboard：后台线程读取，实时面板显示，主循环不再逐帧打印
+    if '--dashboard' in sys.argv:
+        dashboard = Dashboard()
+        for p in ps2:
+            p.start_reader()
+            dashboard.add(p.serial.port, meps2_source(p))
+        dashboard.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            dashboard.stop()
+            for p in ps2:
+                p.close()
+            print("程序退出")
+        sys.exit(0)
+
+    # --events：不再轮询，按下 / 松开 / 摇杆越过阈值时才打印
+    if '--events' in sys.argv:
+        for p in ps2:
+            p.events.add_callback(lambda ev: print(f"{ev.source} {ev.kind} {ev.name} {ev.value}"))
+            p.start_reader()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            for p in ps2:
+                p.close()
+            print("程序退出")
+        sys.exit(0)
+
     try:
         while True:
             for i in range(0,2):
@@ -3,28 +3,13 @@ import asyncio
 import serial_asyncio
 import vgamepad as vg
 import sys
+from meps2_cache import lookup_fingerprint
+from meps2_calib import CalibrationStore
+from meps2_frame import PS2_BUTTONS, FrameBacklog, FrameDecoder
 
+# 摇杆自动校准（输入历史需要 numpy）：已校准的设备用各自的中心和噪声范围代替全局 DEADZONE
+CALIBRATION = True
 
-PS2_DIGITAL = {
-    "R1": (3, 0x01),
-    "R2": (3, 0x02),
-    "L1": (3, 0x04),
-    "L2": (3, 0x08),
-
-    "TRIANGLE": (5, 0x01),
-    "XSHAPED": (5, 0x02),    # X
-    "SQUARE": (5, 0x04),
-    "ROUND": (5, 0x08),      # O
-    "START": (5, 0x10),
-
-    "UP": (7, 0x01),
-    "DOWN": (7, 0x02),
-    "LEFT": (7, 0x04),
-    "RIGHT": (7, 0x08),
-    "SELECT": (7, 0x10),
-    # MODE mapped to special PS button
-    "MODE": (3, 0x10),
-}
 
 # PS2 -> DS4 按钮映射（根据你本地的 DS4_BUTTONS 枚举命名）
 DS4_MAP = {
@@ -53,22 +38,32 @@ DPAD_MAP = {
     (False, False, False, False): vg.DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_NONE,
 }
 
-# 可选：摇杆死区（float 0..1）
+# 可选：摇杆死区（float 0..1），用于还没有校准结果的设备
 DEADZONE = 0.06
 
 
 class MePS2Protocol(asyncio.Protocol):
-    def __init__(self, deadzone=DEADZONE):
-        self.buffer = [0] * 16
-        self.prev = 0
-        self.index = 0
-        self.start = False
-        self.pad = vg.VDS4Gamepad()  # 虚拟 DS4 手柄
+    def __init__(self, deadzone=DEADZONE, pad=None, calibration=None, fingerprint=None):
+        self.decoder = FrameDecoder()  # 边收边累加校验和，校验通过时生成 Frame
+
+        self.backlog = FrameBacklog()  # 积压处理 / 丢弃统计
+
+        self.pad = pad if pad is not None else vg.VDS4Gamepad()  # 虚拟 DS4 手柄
         self.deadzone = deadzone
 
+        # 摇杆校准：连接时生成 0~255 -> -1.0~1.0 的查找表，运行中定期、断开时用本次的输入历史更新校准
+        self.calibration = calibration
+        self.fingerprint = fingerprint
+        if calibration is not None and calibration.calibrated(fingerprint):
+            self.axis_lut = [[v / 32767 for v in lut] for lut in calibration.axis_luts(fingerprint)]
+        else:
+            self.axis_lut = [[self.map_stick_float(v) for v in range(256)]] * 4
+        self.history = calibration.new_history() if calibration is not None else None
+
     def connection_made(self, transport):
         print("🎮 Serial connected. PS2 -> Virtual DS4 running.")
         self.transport = transport
+        self.backlog.connection_made(transport)
 
         # wake device by a tiny press-release (some drivers require)
         try:
@@ -81,38 +76,13 @@ class MePS2Protocol(asyncio.Protocol):
             pass
 
     def data_received(self, data):
-        # data 是 bytes，可以一次包含多帧，逐字节解析
-        for byte in data:
-            c = byte & 0xFF
-            if c == 0x55 and not self.start and self.prev == 0xFF:
-                self.index = 1
-                self.start = True
-            else:
-                self.prev = c
-                if self.start and self.index < len(self.buffer):
-                    self.buffer[self.index] = c
-
-            self.index += 1
-
-            # 超过最大长度表明错位，重置
-            if not self.start and self.index > 12:
-                self.index = 0
-            # 一帧接收完（按原 Arduino 实现 index > 9）
-            elif self.start and self.index > 9:
-                checksum = sum(self.buffer[2:9]) & 0xFF
-                if checksum == self.buffer[9]:
-                    # valid frame
-                    self.start = False
-                    self.index = 0
-                    try:
-                        self.handle_frame()
-                    except Exception as e:
-                        print("handle_frame error:", e, file=sys.stderr)
-                else:
-                    # invalid -> reset
-                    self.start = False
-                    self.index = 0
-                    self.prev = 0
+        frames = self.decoder.feed(data)
+
+        try:
+            for frame in self.backlog.select(frames, len(data)):
+                self.handle_frame(frame)
+        except Exception as e:
+            print("handle_frame error:", e, file=sys.stderr)
 
     # 将 0~255 映射为 -1.0 .. 1.0 float（并应用死区）
     def map_stick_float(self, v):
@@ -131,14 +101,17 @@ class MePS2Protocol(asyncio.Protocol):
         # 把按下映射为 1.0，否则 0.0
         return 1.0 if pressed_bit else 0.0
 
-    def handle_frame(self):
-        bx = self.buffer  # alias
+    def handle_frame(self, frame):
+        if self.history is not None:
+            self.history.push(frame)
+            self.calibration.refresh(self.fingerprint, self.history)
 
-        # 摇杆 -> float
-        lx_f = self.map_stick_float(bx[2])
-        ly_f = self.map_stick_float(bx[4])  # Y 轴取反以符合游戏习惯
-        rx_f = self.map_stick_float(bx[6])
-        ry_f = self.map_stick_float(bx[8])
+        # 摇杆 -> float（连接时生成的查找表）
+        lut = self.axis_lut
+        lx_f = lut[0][frame.lx]
+        ly_f = lut[1][frame.ly]  # Y 轴取反以符合游戏习惯
+        rx_f = lut[2][frame.rx]
+        ry_f = lut[3][frame.ry]
 
         # set float joysticks
         # 使用 float 接口（-1.0 .. 1.0）
@@ -146,8 +119,8 @@ class MePS2Protocol(asyncio.Protocol):
         self.pad.right_joystick_float(x_value_float=rx_f, y_value_float=ry_f)
 
         # 按键（普通按钮）
-        for name, (idx, mask) in PS2_DIGITAL.items():
-            pressed = (bx[idx] & mask) != 0
+        for name, bit in PS2_BUTTONS.items():
+            pressed = (frame.buttons & bit) != 0
 
             if name == "MODE":
                 # MODE -> PS special button
@@ -164,10 +137,10 @@ class MePS2Protocol(asyncio.Protocol):
                         self.pad.release_button(button=ds4_btn)
 
         # DPAD (八向 HAT)
-        up = (bx[7] & 0x01) != 0
-        down = (bx[7] & 0x02) != 0
-        left = (bx[7] & 0x04) != 0
-        right = (bx[7] & 0x08) != 0
+        up = (frame.buttons & PS2_BUTTONS["UP"]) != 0
+        down = (frame.buttons & PS2_BUTTONS["DOWN"]) != 0
+        left = (frame.buttons & PS2_BUTTONS["LEFT"]) != 0
+        right = (frame.buttons & PS2_BUTTONS["RIGHT"]) != 0
 
         dpad_dir = DPAD_MAP.get((up, down, left, right), vg.DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_NONE)
         # directional_pad expects DS4_DPAD_DIRECTIONS enum value
@@ -179,15 +152,15 @@ class MePS2Protocol(asyncio.Protocol):
             pass
 
         # L2 / R2 触发器（float 版本）
-        l2_pressed = (bx[3] & 0x08) != 0
-        r2_pressed = (bx[3] & 0x02) != 0
+        l2_pressed = (frame.buttons & PS2_BUTTONS["L2"]) != 0
+        r2_pressed = (frame.buttons & PS2_BUTTONS["R2"]) != 0
         self.pad.left_trigger_float(value_float=self.map_trigger_float(l2_pressed))
         self.pad.right_trigger_float(value_float=self.map_trigger_float(r2_pressed))
 
         # Touchpad click? （如果需要）
         # PS2 协议没有 touchpad，但可以用某个按键映射触摸板点击（可选）
         # 例如把 SELECT 映射为 touchpad click:
-        if (bx[7] & 0x10) != 0:
+        if (frame.buttons & PS2_BUTTONS["SELECT"]) != 0:
             self.pad.press_special_button(special_button=vg.DS4_SPECIAL_BUTTONS.DS4_SPECIAL_BUTTON_TOUCHPAD)
         else:
             self.pad.release_special_button(special_button=vg.DS4_SPECIAL_BUTTONS.DS4_SPECIAL_BUTTON_TOUCHPAD)
@@ -199,6 +172,8 @@ class MePS2Protocol(asyncio.Protocol):
         # print(f"LX:{lx_f:.2f} LY:{ly_f:.2f} RX:{rx_f:.2f} RY:{ry_f:.2f} L2:{l2_pressed} R2:{r2_pressed}")
 
     def connection_lost(self, exc):
+        if self.calibration is not None:
+            self.calibration.update(self.fingerprint, self.history)
         # 在断开时重置虚拟手柄状态
         try:
             self.pad.reset()
@@ -210,10 +185,19 @@ class MePS2Protocol(asyncio.Protocol):
 
 async def run(port, baudrate):
     loop = asyncio.get_running_loop()
-    await serial_asyncio.create_serial_connection(loop, lambda: MePS2Protocol(), port, baudrate=baudrate)
+    calibration = CalibrationStore() if CALIBRATION else None
+    fingerprint = await loop.run_in_executor(None, lookup_fingerprint, port) if calibration else None
+    transport, protocol = await serial_asyncio.create_serial_connection(
+        loop, lambda: MePS2Protocol(calibration=calibration, fingerprint=fingerprint), port, baudrate=baudrate
+    )
     # 保持运行
-    while True:
-        await asyncio.sleep(1)
+    try:
+        while True:
+            await asyncio.sleep(1)
+    finally:
+        # 关闭端口，由 connection_lost 保存摇杆校准
+        transport.close()
+        await asyncio.sleep(0)
 
 
 if __name__ == "__main__":
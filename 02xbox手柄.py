@@ -2,29 +2,12 @@
 import asyncio
 import serial_asyncio
 import vgamepad as vg
+from meps2_cache import lookup_fingerprint
+from meps2_calib import CalibrationStore
+from meps2_frame import PS2_BUTTONS, FrameBacklog, FrameDecoder
 
-# PS2 Digital Buttons
-PS2_DIGITAL = {
-    "R1": (3, 0x01),
-    "R2": (3, 0x02),
-    "L1": (3, 0x04),
-    "L2": (3, 0x08),
-    "MODE": (3, 0x10),
-    "BUTTON_L": (3, 0x20),
-
-    "TRIANGLE": (5, 0x01),
-    "XSHAPED": (5, 0x02),
-    "SQUARE": (5, 0x04),
-    "ROUND": (5, 0x08),
-    "START": (5, 0x10),
-
-    "UP": (7, 0x01),
-    "DOWN": (7, 0x02),
-    "LEFT": (7, 0x04),
-    "RIGHT": (7, 0x08),
-    "SELECT": (7, 0x10),
-    "BUTTON_R": (7, 0x20),
-}
+# 摇杆自动校准（输入历史需要 numpy）；关闭或设备还没有校准结果时使用固定映射
+CALIBRATION = True
 
 # 映射到 Xbox 按键
 XBOX_MAP = {
@@ -46,70 +29,66 @@ XBOX_MAP = {
 }
 
 
+# 摇杆（0~255 → -32768~32767）
+def map_stick(v):
+    v=v-128
+    if v==-128:
+        v=-127
+    return int(v  / 127 * 32767)
+
+
 class MePS2Protocol(asyncio.Protocol):
-    def __init__(self):
-        self.buffer = [0]*16
-        self.prev = 0
-        self.index = 0
-        self.start = False
+    def __init__(self, calibration=None, fingerprint=None):
+        self.decoder = FrameDecoder()  # 边收边累加校验和，校验通过时生成 Frame
+
+        self.backlog = FrameBacklog()  # 积压处理 / 丢弃统计
 
         self.pad = vg.VX360Gamepad()
 
+        # 摇杆校准：查找表在连接时生成，运行中定期、断开时用本次的输入历史更新校准
+        self.calibration = calibration
+        self.fingerprint = fingerprint
+        if calibration is not None and calibration.calibrated(fingerprint):
+            self.axis_lut = calibration.axis_luts(fingerprint)
+        else:
+            self.axis_lut = [[map_stick(v) for v in range(256)]] * 4
+        self.history = calibration.new_history() if calibration is not None else None
+
     def connection_made(self, transport):
         print("🎮 已连接 PS2 手柄")
         self.transport = transport
+        self.backlog.connection_made(transport)
+
+    def connection_lost(self, exc):
+        if self.calibration is not None:
+            self.calibration.update(self.fingerprint, self.history)
 
     def data_received(self, data):
-        for byte in data:
-            c = byte & 0xFF
-
-            if c == 0x55 and not self.start and self.prev == 0xFF:
-                self.index = 1
-                self.start = True
-            else:
-                self.prev = c
-                if self.start:
-                    self.buffer[self.index] = c
-
-            self.index += 1
-
-            if not self.start and self.index > 12:
-                self.index = 0
-
-            elif self.start and self.index > 9:
-                checksum = sum(self.buffer[2:9]) & 0xFF
-                if checksum == self.buffer[9]:
-                    self.start = False
-                    self.index = 0
-                    self.handle_frame()
-                else:
-                    self.start = False
-                    self.index = 0
-                    self.prev = 0
+        frames = self.decoder.feed(data)
 
-    # --- 主数据解析 ---
-    def handle_frame(self):
-        bx = self.buffer
+        for frame in self.backlog.select(frames, len(data)):
+            self.handle_frame(frame)
 
-        # 摇杆（0~255 → -32768~32767）
-        def map_stick(v):
-            v=v-128
-            if v==-128:
-                v=-127
-            return int(v  / 127 * 32767)
+    # --- 主数据解析 ---
+    def handle_frame(self, frame):
+        if self.history is not None:
+            self.history.push(frame)
+            self.calibration.refresh(self.fingerprint, self.history)
 
-        LX = map_stick(bx[2])
-        LY = -map_stick(bx[4])
-        RX = map_stick(bx[6])
-        RY = -map_stick(bx[8])
+        # 摇杆映射：连接时生成的查找表
+        lut = self.axis_lut
+        LX = lut[0][frame.lx]
+        LY = -lut[1][frame.ly]
+        RX = lut[2][frame.rx]
+        RY = -lut[3][frame.ry]
 
 
         self.pad.left_joystick(x_value=LX, y_value=LY)
         self.pad.right_joystick(x_value=RX, y_value=RY)
 
         # 数字按键
-        for name, (buf_index, mask) in PS2_DIGITAL.items():
-            pressed = (bx[buf_index] & mask) != 0
+        for name, bit in PS2_BUTTONS.items():
+            pressed = (frame.buttons & bit) != 0
             if name in XBOX_MAP:
                 if pressed:
                     self.pad.press_button(button=XBOX_MAP[name])
@@ -117,8 +96,8 @@ class MePS2Protocol(asyncio.Protocol):
                     self.pad.release_button(button=XBOX_MAP[name])
 
         # L2 / R2 特殊处理（因为 Xbox 是模拟触发器）
-        L2_pressed = (bx[3] & 0x08) != 0
-        R2_pressed = (bx[3] & 0x02) != 0
+        L2_pressed = (frame.buttons & PS2_BUTTONS["L2"]) != 0
+        R2_pressed = (frame.buttons & PS2_BUTTONS["R2"]) != 0
 
         self.pad.left_trigger(value=255 if L2_pressed else 0)
         self.pad.right_trigger(value=255 if R2_pressed else 0)
@@ -133,14 +112,21 @@ async def main():
     print(f"连接 {port} ...")
 
     loop = asyncio.get_running_loop()
-    await serial_asyncio.create_serial_connection(
-        loop, lambda: MePS2Protocol(), port, baudrate=baud
+    calibration = CalibrationStore() if CALIBRATION else None
+    fingerprint = await loop.run_in_executor(None, lookup_fingerprint, port) if calibration else None
+    transport, protocol = await serial_asyncio.create_serial_connection(
+        loop, lambda: MePS2Protocol(calibration, fingerprint), port, baudrate=baud
     )
 
     print("手柄1 已启动")
 
-    while True:
-        await asyncio.sleep(1)
+    try:
+        while True:
+            await asyncio.sleep(1)
+    finally:
+        # 关闭端口，由 connection_lost 保存摇杆校准
+        transport.close()
+        await asyncio.sleep(0)
 
 
 
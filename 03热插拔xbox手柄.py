@@ -1,31 +1,53 @@
 # auto_multi_ps2_to_xbox.py
 import asyncio
+import sys
+import time
 import serial_asyncio
 import vgamepad as vg
 from serial.tools import list_ports
-
-# PS2 Digital Buttons
-PS2_DIGITAL = {
-    "R1": (3, 0x01),
-    "R2": (3, 0x02),
-    "L1": (3, 0x04),
-    "L2": (3, 0x08),
-    "MODE": (3, 0x10),
-    "BUTTON_L": (3, 0x20),
-
-    "TRIANGLE": (5, 0x01),
-    "XSHAPED": (5, 0x02),
-    "SQUARE": (5, 0x04),
-    "ROUND": (5, 0x08),
-    "START": (5, 0x10),
-
-    "UP": (7, 0x01),
-    "DOWN": (7, 0x02),
-    "LEFT": (7, 0x04),
-    "RIGHT": (7, 0x08),
-    "SELECT": (7, 0x10),
-    "BUTTON_R": (7, 0x20),
-}
+from meps2_stream import FrameStreamer
+from meps2_cache import device_fingerprint
+from meps2_calib import CalibrationStore, default_axis_lut
+from meps2_autobaud import CANDIDATE_BAUDRATES, baud_cache, probe_port
+from meps2_dashboard import Dashboard, protocol_source
+from meps2_events import EdgeDetector, EventHub
+from meps2_frame import PS2_BUTTONS, FrameBacklog, FrameDecoder
+
+# 本地帧流：None 关闭；("127.0.0.1", 47800) 为 UDP；"/tmp/meps2.sock" 为 Unix 数据报
+STREAM_BIND = None
+
+# 启动时预热的虚拟手柄数量，重新插入时直接复用，避免驱动重新分配
+PAD_POOL_SIZE = 2
+
+# 串口扫描间隔（秒）
+SCAN_INTERVAL = 1
+
+# 摇杆自动校准（输入历史需要 numpy）；关闭后使用固定的 v - 128 映射
+CALIBRATION = True
+
+# 打开端口前自动检测波特率（结果按设备缓存）；关闭后固定使用 BAUDRATE
+AUTO_BAUD = True
+BAUDRATE = 115200
+# 未检测到 MePS2 数据的端口，隔多少秒再尝试；之后每次失败加倍，最多 AUTOBAUD_MAX_RETRY
+# （每次检测都要打开端口，其他串口设备不应被反复打开）
+AUTOBAUD_RETRY = 10
+AUTOBAUD_MAX_RETRY = 300
+# 缓存过波特率的 MePS2 设备（如蓝牙模块先插上、手柄稍后才配对或开机）从该间隔开始重试，
+# 每次失败加倍，最多 AUTOBAUD_RETRY，手柄开始发数据后下一次扫描即可接入
+AUTOBAUD_FAST_RETRY = 0.25
+
+# 端口隔离：持续收到非 MePS2 数据（GPS、调试串口等）的端口会占用事件循环、拖慢其他手柄。
+# 每个统计窗口检查无效字节比例和解码耗时占比，超出则关闭端口，退避一段时间后再尝试（每次隔离退避加倍）。
+# 解码耗时只计 decoder.feed，不含虚拟手柄更新；而且只有无效数据也偏多、连续几个窗口都超时才算，
+# 偶尔一次慢的 pad.update() 不会把正常手柄隔离
+QUARANTINE_WINDOW = 2.0        # 统计窗口（秒）
+QUARANTINE_MIN_BYTES = 1024    # 窗口内字节数达到该值才判断无效比例
+GARBAGE_RATIO = 0.9            # 不属于有效帧的字节比例上限
+CPU_BUDGET = 0.1               # 解码耗时占窗口时间的比例上限
+CPU_GARBAGE_RATIO = 0.5        # 无效字节比例超过该值时，解码耗时超标才计入
+CPU_STRIKES = 3                # 连续多少个窗口解码耗时超标才隔离
+QUARANTINE_BACKOFF = 10        # 第一次隔离的退避秒数
+QUARANTINE_MAX_BACKOFF = 300
 
 # Xbox mapping
 XBOX_MAP = {
@@ -49,148 +71,387 @@ XBOX_MAP = {
 
 # ================== 基础解析类 =====================
 class PS2GamepadProtocol(asyncio.Protocol):
-    def __init__(self, port_name, remove_callback):
-        self.buffer = [0] * 16
-        self.prev = 0
-        self.index = 0
-        self.start = False
+    def __init__(self, port_name, remove_callback, pad, streamer=None, calibration=None, fingerprint=None,
+                 events=None):
+        self.decoder = FrameDecoder()  # 边收边累加校验和，校验通过时生成 Frame
+
+        self.backlog = FrameBacklog()  # 积压处理 / 丢弃统计
+
+        # 面板统计（meps2_dashboard 在另一个线程读取）
+        self.frame_count = 0
+        self.checksum_errors = 0
+        self.last_frame = None
+
+        # 端口隔离统计：收到的字节数、有效帧字节数、解码耗时（当前窗口 / 累计）
+        self.window_start = 0.0
+        self.window_bytes = 0
+        self.window_valid = 0
+        self.window_time = 0.0
+        self.cpu_strikes = 0
+        self.bytes_total = 0
+        self.valid_bytes_total = 0
+        self.parse_time_total = 0.0
+        self.quarantine_reason = None
 
         self.port_name = port_name
-        self.pad = vg.VX360Gamepad()
+        self.pad = pad  # 由 PadPool 分配，断开后归还
 
         self.remove_callback = remove_callback
+        self.streamer = streamer
+
+        # 边沿事件（按下 / 松开 / 摇杆越过阈值），由 GamepadManager 的 EventHub 分发
+        self.events = events
+        self.edges = EdgeDetector(port_name) if events is not None else None
+
+        # 摇杆校准：查找表在连接时生成，运行中定期、断开时用本次的输入历史更新校准
+        self.calibration = calibration
+        self.fingerprint = fingerprint
+        if calibration is not None:
+            self.axis_lut = calibration.axis_luts(fingerprint)
+            self.history = calibration.new_history()
+        else:
+            self.axis_lut = [default_axis_lut()] * 4
+            self.history = None
 
     def connection_made(self, transport):
         print(f"🎮 [连接] {self.port_name}")
         self.transport = transport
+        self.backlog.connection_made(transport)
 
     def connection_lost(self, exc):
         print(f"⚠️ [断开] {self.port_name}")
-        try:
-            self.pad.reset()
-            self.pad.update()
-        except:
-            pass
+        if self.calibration is not None:
+            self.calibration.update(self.fingerprint, self.history)
+        if self.events is not None:
+            self.events.publish(self.edges.release_all())
         self.remove_callback(self.port_name)
 
     def data_received(self, data):
-        for byte in data:
-            c = byte & 0xFF
-
-            if c == 0x55 and not self.start and self.prev == 0xFF:
-                self.index = 1
-                self.start = True
-            else:
-                self.prev = c
-                if self.start:
-                    self.buffer[self.index] = c
-
-            self.index += 1
-
-            if self.start and self.index > 9:
-                checksum = sum(self.buffer[2:9]) & 0xFF
-                if checksum == self.buffer[9]:
-                    self.start = False
-                    self.index = 0
-                    self.handle_frame()
-                else:
-                    self.start = False
-                    self.index = 0
-                    self.prev = 0
-
-            elif not self.start and self.index > 12:
-                self.index = 0
+        started = time.perf_counter()
+        frames = self.decoder.feed(data)
+        elapsed = time.perf_counter() - started
+        self.checksum_errors = self.decoder.checksum_errors
+
+        for frame in self.backlog.select(frames, len(data)):
+            self.handle_frame(frame)
+        self.account(len(data), len(frames) * 10, elapsed)
+
+    def account(self, nbytes, valid, elapsed):
+        """
+        累计解码开销；每个统计窗口结束时检查无效数据比例和解码耗时，超出预算则隔离端口。
+        """
+        self.bytes_total += nbytes
+        self.valid_bytes_total += valid
+        self.parse_time_total += elapsed
+        self.window_bytes += nbytes
+        self.window_valid += valid
+        self.window_time += elapsed
+
+        now = time.monotonic()
+        if not self.window_start:
+            self.window_start = now
+            return
+        span = now - self.window_start
+        if span < QUARANTINE_WINDOW:
+            return
+
+        garbage = 1.0 - self.window_valid / self.window_bytes
+        cpu = self.window_time / span
+        if cpu > CPU_BUDGET and garbage > CPU_GARBAGE_RATIO:
+            self.cpu_strikes += 1
+        else:
+            self.cpu_strikes = 0
+        reason = None
+        if self.window_bytes >= QUARANTINE_MIN_BYTES and garbage > GARBAGE_RATIO:
+            reason = f"无效数据 {garbage:.0%}（{self.window_bytes / span:.0f} B/s）"
+        elif self.cpu_strikes >= CPU_STRIKES:
+            reason = f"解码连续 {self.cpu_strikes} 个窗口占用 {cpu:.0%} 事件循环时间（无效数据 {garbage:.0%}）"
+
+        self.window_start = now
+        self.window_bytes = self.window_valid = 0
+        self.window_time = 0.0
+        if reason is not None:
+            self.quarantine(reason)
+
+    def quarantine(self, reason):
+        """
+        停止读取并关闭端口，由 GamepadManager.remove_port 记录原因并安排退避。
+        """
+        if self.quarantine_reason is not None:
+            return
+        self.quarantine_reason = reason
+        print(f"🚫 [隔离] {self.port_name}: {reason}")
+        self.transport.close()
 
     # ================== 解析帧 =====================
-    def handle_frame(self):
-        bx = self.buffer
-
-        def map_stick(v):
-            v = v - 128
-            if v == -128:
-                v = -127
-            return int(v * 256)
-
-        LX = map_stick(bx[2])
-        LY = -map_stick(bx[4])
-        RX = map_stick(bx[6])
-        RY = -map_stick(bx[8])
+    def handle_frame(self, frame):
+        self.frame_count += 1
+        self.last_frame = frame
+        if self.history is not None:
+            self.history.push(frame)
+            self.calibration.refresh(self.fingerprint, self.history)
+
+        # 摇杆映射：连接时按校准结果预先生成的查找表
+        lut = self.axis_lut
+        LX = lut[0][frame.lx]
+        LY = -lut[1][frame.ly]
+        RX = lut[2][frame.rx]
+        RY = -lut[3][frame.ry]
 
         self.pad.left_joystick(x_value=LX, y_value=LY)
         self.pad.right_joystick(x_value=RX, y_value=RY)
 
-        for name, (buf_index, mask) in PS2_DIGITAL.items():
-            pressed = (bx[buf_index] & mask) != 0
+        for name, bit in PS2_BUTTONS.items():
+            pressed = (frame.buttons & bit) != 0
             if name in XBOX_MAP:
                 if pressed:
                     self.pad.press_button(button=XBOX_MAP[name])
                 else:
                     self.pad.release_button(button=XBOX_MAP[name])
 
-        L2 = 255 if (bx[3] & 0x08) else 0
-        R2 = 255 if (bx[3] & 0x02) else 0
+        L2 = 255 if (frame.buttons & PS2_BUTTONS["L2"]) else 0
+        R2 = 255 if (frame.buttons & PS2_BUTTONS["R2"]) else 0
 
         self.pad.left_trigger(value=L2)
         self.pad.right_trigger(value=R2)
 
         self.pad.update()
 
+        if self.streamer is not None:
+            self.streamer.publish(self.port_name, frame)
+
+        if self.events is not None:
+            self.events.publish(self.edges.feed(frame))
+
+
+# ================== 虚拟手柄池 =====================
+class PadPool:
+    def __init__(self, size=PAD_POOL_SIZE, factory=None):
+        self.factory = factory or vg.VX360Gamepad
+        self.free = [self.factory() for _ in range(size)]
+        self.owner = {}  # port -> pad，断开后保留，重新插入时优先拿回同一个手柄
+
+    def acquire(self, port):
+        pad = self.owner.get(port)
+        if pad is None or pad not in self.free:
+            # 优先选没有被其他端口占用过的空闲手柄
+            owned = set(map(id, self.owner.values()))
+            unowned = [p for p in self.free if id(p) not in owned]
+            if unowned:
+                pad = unowned[0]
+            elif self.free:
+                pad = self.free[0]
+            else:
+                pad = self.factory()
+                self.free.append(pad)
+            # 被抢走的手柄从旧端口的记录里移除
+            for k in [k for k, v in self.owner.items() if v is pad]:
+                del self.owner[k]
+            self.owner[port] = pad
+
+        self.free.remove(pad)
+        return pad
+
+    def release(self, port, pad):
+        # 归还前清零，游戏侧看到的是一个静止的手柄而不是设备消失
+        try:
+            pad.reset()
+            pad.update()
+        except Exception:
+            pass
+        if pad not in self.free:
+            self.free.append(pad)
+
 
 # ================== 热插拔管理类 =====================
 class GamepadManager:
-    def __init__(self):
+    def __init__(self, streamer=None, pool=None, dashboard=None, events=None):
         self.active_ports = {}  # port -> (transport, protocol)
+        self.streamer = streamer
+        # 所有端口的边沿事件：manager.events.subscribe() / add_callback()
+        self.events = events if events is not None else EventHub()
+        self.dashboard = dashboard
+        self.pool = pool if pool is not None else PadPool()
+        self.calibration = CalibrationStore() if CALIBRATION else None
+        self.fingerprints = {}  # port -> 设备指纹
+        self.baud_cache = baud_cache()
+        self.retry_at = {}      # port -> 下次尝试打开的时间（未检测到波特率或被隔离）
+        self.probe_failures = {}  # port -> 连续未检测到数据的次数
+        self.quarantined = {}   # port -> {'reason', 'count', 'until'}，端口拔出后清除
 
     def remove_port(self, port):
         if port in self.active_ports:
             print(f"🔥 移除手柄实例：{port}")
-            del self.active_ports[port]
+            transport, protocol = self.active_ports.pop(port)
+            if self.dashboard is not None:
+                self.dashboard.remove(port)
+            self.pool.release(port, protocol.pad)
+            if protocol.quarantine_reason is not None:
+                self.backoff_port(port, protocol.quarantine_reason)
+
+    def backoff_port(self, port, reason):
+        """
+        被隔离的端口在退避时间内不再打开，连续隔离时退避时间加倍。
+        """
+        count = self.quarantined.get(port, {}).get("count", 0) + 1
+        backoff = min(QUARANTINE_BACKOFF * 2 ** (count - 1), QUARANTINE_MAX_BACKOFF)
+        until = time.monotonic() + backoff
+        self.quarantined[port] = {"reason": reason, "count": count, "until": until}
+        self.retry_at[port] = until
+        print(f"⏸ {port} 暂停 {backoff:.0f} 秒（第 {count} 次隔离）")
+
+    def metrics(self):
+        """
+        各端口的解析统计和隔离状态。
+        :return: {port: {...}}，活动端口 state 为 'active'，退避中的端口为 'quarantined'
+        """
+        now = time.monotonic()
+        result = {}
+        for port, (transport, protocol) in self.active_ports.items():
+            result[port] = {
+                "state": "active",
+                "bytes": protocol.bytes_total,
+                "valid_bytes": protocol.valid_bytes_total,
+                "parse_time": protocol.parse_time_total,
+                "frames": protocol.frame_count,
+                "checksum_errors": protocol.checksum_errors,
+                "drained_frames": protocol.backlog.drained_frames,
+                "backlog_events": protocol.backlog.backlog_events,
+                "quarantines": self.quarantined.get(port, {}).get("count", 0),
+            }
+        for port, q in self.quarantined.items():
+            if port not in result:
+                result[port] = {
+                    "state": "quarantined",
+                    "reason": q["reason"],
+                    "quarantines": q["count"],
+                    "retry_in": max(0.0, q["until"] - now),
+                }
+        return result
 
     async def scan_ports(self):
-        ports = [p.device for p in list_ports.comports()]
-        return ports
-
-    async def manage_hotplug(self):
+        # 枚举串口在 Windows 上可能要几十毫秒，放到线程里做
+        infos = await asyncio.get_running_loop().run_in_executor(None, list_ports.comports)
+        self.fingerprints = {p.device: device_fingerprint(p) for p in infos}
+        return [p.device for p in infos]
+
+    def probe_retry_delay(self, p):
+        """
+        未检测到数据后的重试间隔，每次失败加倍：已知的 MePS2 设备从 AUTOBAUD_FAST_RETRY 开始、最多 AUTOBAUD_RETRY，
+        其他端口从 AUTOBAUD_RETRY 开始、最多 AUTOBAUD_MAX_RETRY。
+        """
+        n = self.probe_failures.get(p, 0)
+        self.probe_failures[p] = n + 1
+        if self.baud_cache.get(self.fingerprints.get(p, p)) is None:
+            return min(AUTOBAUD_RETRY * 2 ** n, AUTOBAUD_MAX_RETRY)
+        return min(AUTOBAUD_FAST_RETRY * 2 ** n, AUTOBAUD_RETRY)
+
+    async def add_port(self, p):
+        """
+        检测波特率并打开一个新端口，分配虚拟手柄。
+        """
         loop = asyncio.get_running_loop()
+        print(f"➕ 新设备：{p}")
+
+        baudrate = BAUDRATE
+        if AUTO_BAUD:
+            try:
+                result = await loop.run_in_executor(
+                    None, probe_port, p, self.fingerprints.get(p, p), CANDIDATE_BAUDRATES, self.baud_cache
+                )
+            except Exception as e:
+                print(f"❌ 无法打开 {p}: {e}")
+                return
+            if result.baudrate is None:
+                delay = self.probe_retry_delay(p)
+                print(f"❔ {p} 未检测到 MePS2 数据，{delay:g} 秒后重试")
+                self.retry_at[p] = time.monotonic() + delay
+                return
+            self.probe_failures.pop(p, None)
+            baudrate = result.baudrate
+            print(f"📶 {p}: {baudrate} bps，首帧 {result.first_frame * 1000:.0f} ms"
+                  f"{'（缓存）' if result.cached else ''}")
+
+        pad = self.pool.acquire(p)
+        try:
+            transport, protocol = await serial_asyncio.create_serial_connection(
+                loop,
+                lambda: PS2GamepadProtocol(
+                    p, self.remove_port, pad, self.streamer,
+                    self.calibration, self.fingerprints.get(p, p), self.events
+                ),
+                p,
+                baudrate=baudrate
+            )
+            self.active_ports[p] = (transport, protocol)
+            if self.dashboard is not None:
+                self.dashboard.add(p, protocol_source(protocol))
+            print(f"🎮 Xbox 手柄已分配：{p}")
+
+        except Exception as e:
+            self.pool.release(p, pad)
+            print(f"❌ 无法打开 {p}: {e}")
+
+    async def sync_ports(self, ports):
+        """
+        按当前端口列表打开新设备、关闭已移除的设备（热插拔扫描的一步）。
+        """
+        # 检查新增端口：同时打开，互不等待
+        new_ports = [
+            p for p in ports
+            if p not in self.active_ports and self.retry_at.get(p, 0) <= time.monotonic()
+        ]
+        if new_ports:
+            await asyncio.gather(*(self.add_port(p) for p in new_ports))
+
+        # 检查移除的端口
+        for p in list(self.retry_at):
+            if p not in ports:
+                del self.retry_at[p]
+                self.quarantined.pop(p, None)
+                self.probe_failures.pop(p, None)
+        for p in list(self.active_ports.keys()):
+            if p not in ports:
+                print(f"➖ 设备移除：{p}")
+
+                transport, protocol = self.active_ports[p]
+                transport.close()
+
+    async def close(self):
+        """
+        退出时关闭所有端口，由 connection_lost 保存校准、归还虚拟手柄。
+        """
+        for transport, protocol in list(self.active_ports.values()):
+            transport.close()
+        # 串口传输在下一轮事件循环中调用 connection_lost
+        await asyncio.sleep(0)
 
+    async def manage_hotplug(self):
         while True:
             ports = await self.scan_ports()
-
-            # 检查新增端口
-            for p in ports:
-                if p not in self.active_ports:
-                    print(f"➕ 新设备：{p}")
-
-                    try:
-                        transport, protocol = await serial_asyncio.create_serial_connection(
-                            loop,
-                            lambda pn=p: PS2GamepadProtocol(pn, self.remove_port),
-                            p,
-                            baudrate=115200
-                        )
-                        self.active_ports[p] = (transport, protocol)
-                        print(f"🎮 Xbox 手柄已创建：{p}")
-
-                    except Exception as e:
-                        print(f"❌ 无法打开 {p}: {e}")
-
-            # 检查移除的端口
-            for p in list(self.active_ports.keys()):
-                if p not in ports:
-                    print(f"➖ 设备移除：{p}")
-
-                    transport, protocol = self.active_ports[p]
-                    transport.close()
-
-            await asyncio.sleep(1)  # 1秒扫描一次
+            await self.sync_ports(ports)
+            await asyncio.sleep(SCAN_INTERVAL)
 
 
 # ================== 主程序 =====================
 async def main():
-    manager = GamepadManager()
+    streamer = FrameStreamer(STREAM_BIND) if STREAM_BIND is not None else None
+    # --dashboard：用实时面板代替逐条打印
+    dashboard = Dashboard() if "--dashboard" in sys.argv else None
+    manager = GamepadManager(streamer, dashboard=dashboard)
+    # --events：打印按下 / 松开 / 摇杆越过阈值事件
+    if "--events" in sys.argv:
+        manager.events.add_callback(lambda ev: print(f"🔔 {ev.source} {ev.kind} {ev.name} {ev.value}"))
     print("🔍 正在监控串口热插拔 ...")
-
-    await manager.manage_hotplug()
+    if dashboard is not None:
+        dashboard.start()
+
+    try:
+        await manager.manage_hotplug()
+    finally:
+        await manager.close()
+        if streamer is not None:
+            streamer.close()
 
 
 if __name__ == "__main__":
@@ -1,30 +1,25 @@
 # dual_serial_two_xbox.py
 import asyncio
+import sys
 import serial_asyncio
 import vgamepad as vg
+from meps2_stream import FrameStreamer
+from meps2_cache import lookup_fingerprint
+from meps2_calib import CalibrationStore, default_axis_lut
+from meps2_autobaud import CANDIDATE_BAUDRATES, baud_cache, probe_port
+from meps2_dashboard import Dashboard, protocol_source
+from meps2_events import EdgeDetector, EventHub
+from meps2_frame import PS2_BUTTONS, FrameBacklog, FrameDecoder
 
-# PS2 Digital Buttons
-PS2_DIGITAL = {
-    "R1": (3, 0x01),
-    "R2": (3, 0x02),
-    "L1": (3, 0x04),
-    "L2": (3, 0x08),
-    "MODE": (3, 0x10),
-    "BUTTON_L": (3, 0x20),
-
-    "TRIANGLE": (5, 0x01),
-    "XSHAPED": (5, 0x02),
-    "SQUARE": (5, 0x04),
-    "ROUND": (5, 0x08),
-    "START": (5, 0x10),
-
-    "UP": (7, 0x01),
-    "DOWN": (7, 0x02),
-    "LEFT": (7, 0x04),
-    "RIGHT": (7, 0x08),
-    "SELECT": (7, 0x10),
-    "BUTTON_R": (7, 0x20),
-}
+# 本地帧流：None 关闭；("127.0.0.1", 47800) 为 UDP；"/tmp/meps2.sock" 为 Unix 数据报
+STREAM_BIND = None
+
+# 摇杆自动校准（输入历史需要 numpy）；关闭后使用固定的 v - 128 映射
+CALIBRATION = True
+
+# 打开端口前自动检测波特率（结果按设备缓存）；关闭或检测失败时使用 BAUDRATE
+AUTO_BAUD = True
+BAUDRATE = 115200
 
 # Mapping to Xbox buttons
 XBOX_MAP = {
@@ -48,21 +43,45 @@ XBOX_MAP = {
 
 # ------------ 每个串口对应一个实例 ----------------
 class PS2GamepadProtocol(asyncio.Protocol):
-    def __init__(self, port_name):
-        self.buffer = [0] * 16
-        self.prev = 0
-        self.index = 0
-        self.start = False
+    def __init__(self, port_name, streamer=None, calibration=None, fingerprint=None, pad=None, events=None):
+        self.decoder = FrameDecoder()  # 边收边累加校验和，校验通过时生成 Frame
+
+        self.backlog = FrameBacklog()  # 积压处理 / 丢弃统计
+
+        # 面板统计（meps2_dashboard 在另一个线程读取）
+        self.frame_count = 0
+        self.checksum_errors = 0
+        self.last_frame = None
 
         self.port_name = port_name
-        self.pad = vg.VX360Gamepad()   # 每个串口初始化一个虚拟 XBOX 手柄
+        self.pad = pad if pad is not None else vg.VX360Gamepad()   # 每个串口对应一个虚拟 XBOX 手柄
+        self.streamer = streamer
+
+        # 边沿事件（按下 / 松开 / 摇杆越过阈值），多个端口共用一个 EventHub
+        self.events = events
+        self.edges = EdgeDetector(port_name) if events is not None else None
+
+        # 摇杆校准：查找表在连接时生成，运行中定期、断开时用本次的输入历史更新校准
+        self.calibration = calibration
+        self.fingerprint = fingerprint
+        if calibration is not None:
+            self.axis_lut = calibration.axis_luts(fingerprint)
+            self.history = calibration.new_history()
+        else:
+            self.axis_lut = [default_axis_lut()] * 4
+            self.history = None
 
     def connection_made(self, transport):
         print(f"🎮 已连接：{self.port_name}")
         self.transport = transport
+        self.backlog.connection_made(transport)
 
     def connection_lost(self, exc):
         print(f"⚠️ 串口断开：{self.port_name}")
+        if self.calibration is not None:
+            self.calibration.update(self.fingerprint, self.history)
+        if self.events is not None:
+            self.events.publish(self.edges.release_all())
         try:
             self.pad.reset()
             self.pad.update()
@@ -70,58 +89,33 @@ class PS2GamepadProtocol(asyncio.Protocol):
             pass
 
     def data_received(self, data):
-        for byte in data:
-            c = byte & 0xFF
+        frames = self.decoder.feed(data)
+        self.checksum_errors = self.decoder.checksum_errors
 
-            # 帧头
-            if c == 0x55 and not self.start and self.prev == 0xFF:
-                self.index = 1
-                self.start = True
-            else:
-                self.prev = c
-                if self.start and self.index < len(self.buffer):
-                    self.buffer[self.index] = c
-
-            self.index += 1
-
-            # 完整帧
-            if self.start and self.index > 9:
-                checksum = sum(self.buffer[2:9]) & 0xFF
-
-                if checksum == self.buffer[9]:
-                    self.start = False
-                    self.index = 0
-                    self.handle_frame()
-                else:
-                    self.start = False
-                    self.index = 0
-                    self.prev = 0
-
-            elif not self.start and self.index > 12:
-                self.index = 0
+        for frame in self.backlog.select(frames, len(data)):
+            self.handle_frame(frame)
 
     # ----------------- 按键 + 摇杆处理 ------------------
-    def handle_frame(self):
-        bx = self.buffer
-
-        # 摇杆映射
-        def map_stick(v):
-            v = v - 128
-            if v == -128:
-                v = -127
-            return int(v * 256)  # -32768~32767
-
-        LX = map_stick(bx[2])
-        LY = -map_stick(bx[4])
-        RX = map_stick(bx[6])
-        RY = -map_stick(bx[8])
+    def handle_frame(self, frame):
+        self.frame_count += 1
+        self.last_frame = frame
+        if self.history is not None:
+            self.history.push(frame)
+            self.calibration.refresh(self.fingerprint, self.history)
+
+        # 摇杆映射：连接时按校准结果预先生成的查找表
+        lut = self.axis_lut
+        LX = lut[0][frame.lx]
+        LY = -lut[1][frame.ly]
+        RX = lut[2][frame.rx]
+        RY = -lut[3][frame.ry]
 
         self.pad.left_joystick(x_value=LX, y_value=LY)
         self.pad.right_joystick(x_value=RX, y_value=RY)
 
         # 数字按键
-        for name, (buf_index, mask) in PS2_DIGITAL.items():
-            pressed = (bx[buf_index] & mask) != 0
+        for name, bit in PS2_BUTTONS.items():
+            pressed = (frame.buttons & bit) != 0
             if name in XBOX_MAP:
                 if pressed:
                     self.pad.press_button(button=XBOX_MAP[name])
@@ -129,36 +123,116 @@ class PS2GamepadProtocol(asyncio.Protocol):
                     self.pad.release_button(button=XBOX_MAP[name])
 
         # L2 / R2 → Xbox 触发器
-        L2 = 255 if (bx[3] & 0x08) else 0
-        R2 = 255 if (bx[3] & 0x02) else 0
+        L2 = 255 if (frame.buttons & PS2_BUTTONS["L2"]) else 0
+        R2 = 255 if (frame.buttons & PS2_BUTTONS["R2"]) else 0
 
         self.pad.left_trigger(value=L2)
         self.pad.right_trigger(value=R2)
 
         self.pad.update()
 
+        if self.streamer is not None:
+            self.streamer.publish(self.port_name, frame)
+
+        if self.events is not None:
+            self.events.publish(self.edges.feed(frame))
+
 
 # ---------------- 启动多个串口 ----------------
-async def start_multi_handpads(port_list):
+async def open_handpad(port, streamer=None, calibration=None, cache=None, dashboard=None, pad=None, events=None):
+    """
+    检测波特率并打开一个串口。
+    :param pad: 预先创建的虚拟手柄或创建它的 Future（与端口检测并行）；None 时由协议自己创建
+    :param events: EventHub，订阅该端口的边沿事件；None 时不检测
+    :return: protocol；打不开时返回 None，不影响同时打开的其他端口
+    """
     loop = asyncio.get_running_loop()
+    print(f"⏳ 正在连接 {port} ...")
+
+    try:
+        fingerprint = None
+        if AUTO_BAUD or calibration is not None:
+            fingerprint = await loop.run_in_executor(None, lookup_fingerprint, port)
+
+        baudrate = BAUDRATE
+        if AUTO_BAUD:
+            result = await loop.run_in_executor(
+                None, probe_port, port, fingerprint, CANDIDATE_BAUDRATES, cache
+            )
+            if result.baudrate is None:
+                print(f"❔ {port} 未检测到 MePS2 数据，使用 {BAUDRATE} bps")
+            else:
+                baudrate = result.baudrate
+                print(f"📶 {port}: {baudrate} bps，首帧 {result.first_frame * 1000:.0f} ms"
+                      f"{'（缓存）' if result.cached else ''}")
 
-    for port in port_list:
-        print(f"⏳ 正在连接 {port} ...")
+        if asyncio.isfuture(pad):
+            pad = await pad
 
-        await serial_asyncio.create_serial_connection(
+        transport, protocol = await serial_asyncio.create_serial_connection(
             loop,
-            lambda p=port: PS2GamepadProtocol(p),
+            lambda: PS2GamepadProtocol(port, streamer, calibration, fingerprint, pad, events),
             port,
-            baudrate=115200
+            baudrate=baudrate
         )
-
-    print("🎉 所有手柄已启动，尽情游戏！")
-    while True:
-        await asyncio.sleep(1)
+    except Exception as e:
+        print(f"❌ 无法打开 {port}: {e}")
+        if asyncio.isfuture(pad):
+            pad.cancel()
+        return None
+    if dashboard is not None:
+        dashboard.add(port, protocol_source(protocol))
+    return protocol
+
+
+async def close_handpads(protocols):
+    """
+    退出时关闭已打开的端口，由 connection_lost 保存校准、复位虚拟手柄。
+    """
+    for protocol in protocols:
+        if protocol is not None:
+            protocol.transport.close()
+    # 串口传输在下一轮事件循环中调用 connection_lost
+    await asyncio.sleep(0)
+
+
+async def start_multi_handpads(port_list, dashboard=None, events=None):
+    streamer = FrameStreamer(STREAM_BIND) if STREAM_BIND is not None else None
+    calibration = CalibrationStore() if CALIBRATION else None
+    cache = baud_cache()
+
+    # 所有串口同时打开，互不等待；某个端口失败不影响其他端口
+    protocols = await asyncio.gather(*(
+        open_handpad(port, streamer, calibration, cache, dashboard, events=events) for port in port_list
+    ))
+    opened = sum(p is not None for p in protocols)
+
+    if opened == len(port_list):
+        print("🎉 所有手柄已启动，尽情游戏！")
+    else:
+        print(f"⚠️ {opened}/{len(port_list)} 个手柄已启动")
+    if dashboard is not None:
+        dashboard.start()
+    try:
+        while True:
+            await asyncio.sleep(1)
+    finally:
+        await close_handpads(protocols)
+        if streamer is not None:
+            streamer.close()
 
 
 if __name__ == "__main__":
     # 你只需要改这里 —— 每个串口绑定一个虚拟 Xbox
     PORTS = ["COM3", "COM4"]
 
-    asyncio.run(start_multi_handpads(PORTS))
+    # --dashboard：用实时面板代替逐条打印
+    dashboard = Dashboard() if "--dashboard" in sys.argv else None
+
+    # --events：打印按下 / 松开 / 摇杆越过阈值事件
+    events = None
+    if "--events" in sys.argv:
+        events = EventHub()
+        events.add_callback(lambda ev: print(f"🔔 {ev.source} {ev.kind} {ev.name} {ev.value}"))
+
+    asyncio.run(start_multi_handpads(PORTS, dashboard, events))
@@ -0,0 +1,124 @@
+# cold_start.py
+# 冷启动基准：多次启动 00统一启动.py，统计导入后端、打开端口、首次输入的耗时。
+#
+# 用 pty 模拟串口（后台线程持续发送帧），用 fakes/vgamepad.py 代替 ViGEm。
+# 每次在独立进程中运行（--exit-after-first-frame --json），避免模块缓存影响导入耗时。
+#
+# 仅支持 Linux。用法：
+#   python benchmarks/cold_start.py --mode xbox --ports 2 --runs 10
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+LAUNCHER = glob.glob(os.path.join(ROOT, "00*.py"))[0]
+
+METRICS = ("import", "open", "first_input", "wall")
+
+
+def make_frame(lx=128, ly=128, rx=128, ry=128, b3=0, b5=0, b7=0):
+    payload = [lx, b3, ly, b5, rx, b7, ry]
+    return bytes([0xFF, 0x55] + payload + [sum(payload) & 0xFF])
+
+
+class FakePorts:
+    """
+    一组 pty 串口，后台线程每隔 interval 秒向每个端口写一帧。
+    """
+    def __init__(self, count, interval=0.01):
+        self.pairs = []
+        for _ in range(count):
+            master, slave = os.openpty()
+            tty.setraw(slave)
+            self.pairs.append((master, slave, os.ttyname(slave)))
+        self.interval = interval
+        self.running = True
+        self.thread = threading.Thread(target=self._feed, daemon=True)
+        self.thread.start()
+
+    @property
+    def paths(self):
+        return [path for _, _, path in self.pairs]
+
+    def _feed(self):
+        frame = make_frame(lx=200)
+        while self.running:
+            for master, _, _ in self.pairs:
+                try:
+                    os.write(master, frame)
+                except OSError:
+                    pass
+            time.sleep(self.interval)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        for master, slave, _ in self.pairs:
+            os.close(master)
+            os.close(slave)
+
+
+def run_once(mode, paths, auto_baud, home):
+    cmd = [sys.executable, LAUNCHER, mode, *paths, "--exit-after-first-frame", "--json"]
+    if not auto_baud:
+        cmd += ["--baud", "115200"]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([os.path.join(HERE, "fakes"), ROOT])
+    env["HOME"] = home  # 缓存写到临时目录
+    start = time.perf_counter()
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=60)
+    wall = time.perf_counter() - start
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr)
+    # 退出时脚本还会打印断开信息，取 JSON 那一行
+    line = next(l for l in out.stdout.splitlines() if l.startswith("{"))
+    report = json.loads(line)
+    report["wall"] = wall
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动耗时基准")
+    parser.add_argument("--mode", choices=("xbox", "ds4"), default="xbox")
+    parser.add_argument("--ports", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--auto-baud", action="store_true", help="包含波特率检测（xbox 模式）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出汇总，便于记录历史")
+    args = parser.parse_args()
+
+    ports = FakePorts(args.ports)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as home:
+            for _ in range(args.runs):
+                results.append(run_once(args.mode, ports.paths, args.auto_baud, home))
+    finally:
+        ports.close()
+
+    summary = {}
+    for key in METRICS:
+        values = sorted(r[key] * 1000 for r in results)
+        summary[key] = {
+            "median_ms": statistics.median(values),
+            "max_ms": values[-1],
+        }
+
+    if args.json:
+        print(json.dumps({"mode": args.mode, "ports": args.ports, "runs": args.runs, "metrics": summary}))
+        return
+    print(f"模式 {args.mode}，{args.ports} 个端口，{args.runs} 次")
+    for key in METRICS:
+        print(f"  {key:<12} median={summary[key]['median_ms']:7.1f} ms  max={summary[key]['max_ms']:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
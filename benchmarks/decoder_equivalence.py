@@ -0,0 +1,148 @@
+# decoder_equivalence.py
+# 解码器等价性检查：meps2_frame.FrameDecoder 与原来各脚本里逐字节的状态机对同一字节流的输出必须一致。
+#
+# 随机生成有效帧、校验和错误的帧、被截断的帧和垃圾字节（含 0xFF 0x55 伪帧头）混合的字节流，
+# 按随机大小分块送入两个解析器，比较解出的帧和校验失败次数，并统计每字节解析耗时。
+# 结果不一致时以非 0 退出码结束。用法：
+#   python benchmarks/decoder_equivalence.py --frames 20000
+import argparse
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from meps2_frame import Frame, FrameDecoder  # noqa: E402
+
+
+class OldParser:
+    """
+    改用 FrameDecoder 之前各桥接脚本 data_received 中的状态机（原样保留，仅加上校验失败计数）。
+    """
+    def __init__(self):
+        self.buffer = [0] * 16
+        self.prev = 0
+        self.index = 0
+        self.start = False
+        self.checksum_errors = 0
+
+    def feed(self, data):
+        frames = []
+        for byte in data:
+            c = byte & 0xFF
+
+            if c == 0x55 and not self.start and self.prev == 0xFF:
+                self.index = 1
+                self.start = True
+            else:
+                self.prev = c
+                if self.start:
+                    self.buffer[self.index] = c
+
+            self.index += 1
+
+            if not self.start and self.index > 12:
+                self.index = 0
+
+            elif self.start and self.index > 9:
+                checksum = sum(self.buffer[2:9]) & 0xFF
+                if checksum == self.buffer[9]:
+                    self.start = False
+                    self.index = 0
+                    frames.append(self.buffer[:10])
+                else:
+                    self.checksum_errors += 1
+                    self.start = False
+                    self.index = 0
+                    self.prev = 0
+        return frames
+
+
+def to_frame(buffer):
+    lx, b3, ly, b5, rx, b7, ry = buffer[2:9]
+    return Frame(lx, ly, rx, ry, b3 | (b5 << 8) | (b7 << 16))
+
+
+def make_stream(count, rng):
+    """
+    生成 count 段混合数据，大约 70% 为有效帧。
+    """
+    out = bytearray()
+    for _ in range(count):
+        payload = [rng.randrange(256) for _ in range(7)]
+        frame = [0xFF, 0x55] + payload + [sum(payload) & 0xFF]
+        kind = rng.random()
+        if kind < 0.7:
+            out += bytes(frame)
+        elif kind < 0.8:
+            frame[-1] ^= rng.randrange(1, 256)   # 校验和错误
+            out += bytes(frame)
+        elif kind < 0.9:
+            out += bytes(frame[:rng.randrange(1, 10)])   # 被截断
+        else:
+            junk = [rng.choice((0xFF, 0x55, rng.randrange(256))) for _ in range(rng.randrange(1, 40))]
+            out += bytes(junk)
+    return bytes(out)
+
+
+def split(data, rng, max_chunk):
+    chunks = []
+    i = 0
+    while i < len(data):
+        n = rng.randint(1, max_chunk)
+        chunks.append(data[i:i + n])
+        i += n
+    return chunks
+
+
+def run(parser, chunks):
+    frames = []
+    t = time.perf_counter()
+    for chunk in chunks:
+        frames.extend(parser.feed(chunk))
+    return frames, time.perf_counter() - t
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--max-chunk", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=5, help="计时重复次数，取最小值")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    rng = random.Random(seed)
+    data = make_stream(args.frames, rng)
+    chunks = split(data, rng, args.max_chunk)
+    print(f"种子 {seed}：{len(data)} 字节，{len(chunks)} 块")
+
+    old, new = OldParser(), FrameDecoder()
+    old_frames, _ = run(old, chunks)
+    new_frames, _ = run(new, chunks)
+    old_frames = [to_frame(b) for b in old_frames]
+
+    ok = old_frames == new_frames and old.checksum_errors == new.checksum_errors
+    print(f"帧数: 旧 {len(old_frames)} / 新 {len(new_frames)}，"
+          f"校验失败: 旧 {old.checksum_errors} / 新 {new.checksum_errors}")
+
+    old_time = min(run(OldParser(), chunks)[1] for _ in range(args.repeat))
+    new_time = min(run(FrameDecoder(), chunks)[1] for _ in range(args.repeat))
+    print(f"解析耗时 ns/字节: 旧 {old_time / len(data) * 1e9:.0f}，新 {new_time / len(data) * 1e9:.0f}")
+
+    if not ok:
+        for i, (a, b) in enumerate(zip(old_frames, new_frames)):
+            if a != b:
+                print(f"❌ 第 {i} 帧不一致: 旧 {a} / 新 {b}")
+                break
+        else:
+            print("❌ 帧数或校验失败次数不一致")
+        sys.exit(1)
+    print("✅ 输出一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# 假的 vgamepad 后端，仅供基准测试使用：不依赖 ViGEm 驱动，可在 Linux 上运行。
+# 提供与 vgamepad 相同的类名和枚举名，并记录存活实例和 update 次数。
+import weakref
+
+live_pads = weakref.WeakSet()
+
+
+class _Enum:
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, item):
+        if item.startswith("__"):
+            raise AttributeError(item)
+        return f"{self._name}.{item}"
+
+
+XUSB_BUTTON = _Enum("XUSB_BUTTON")
+DS4_BUTTONS = _Enum("DS4_BUTTONS")
+DS4_DPAD_DIRECTIONS = _Enum("DS4_DPAD_DIRECTIONS")
+DS4_SPECIAL_BUTTONS = _Enum("DS4_SPECIAL_BUTTONS")
+
+
+class _FakePad:
+    def __init__(self):
+        self.updates = 0
+        self.pressed = set()
+        self.state = {}
+        live_pads.add(self)
+
+    def press_button(self, button):
+        self.pressed.add(button)
+
+    def release_button(self, button):
+        self.pressed.discard(button)
+
+    def press_special_button(self, special_button):
+        self.pressed.add(special_button)
+
+    def release_special_button(self, special_button):
+        self.pressed.discard(special_button)
+
+    def directional_pad(self, direction):
+        self.state["dpad"] = direction
+
+    def left_joystick(self, x_value, y_value):
+        self.state["left"] = (x_value, y_value)
+
+    def right_joystick(self, x_value, y_value):
+        self.state["right"] = (x_value, y_value)
+
+    def left_joystick_float(self, x_value_float, y_value_float):
+        self.state["left"] = (x_value_float, y_value_float)
+
+    def right_joystick_float(self, x_value_float, y_value_float):
+        self.state["right"] = (x_value_float, y_value_float)
+
+    def left_trigger(self, value):
+        self.state["lt"] = value
+
+    def right_trigger(self, value):
+        self.state["rt"] = value
+
+    def left_trigger_float(self, value_float):
+        self.state["lt"] = value_float
+
+    def right_trigger_float(self, value_float):
+        self.state["rt"] = value_float
+
+    def reset(self):
+        self.pressed.clear()
+        self.state.clear()
+
+    def update(self):
+        self.updates += 1
+
+
+class VX360Gamepad(_FakePad):
+    pass
+
+
+class VDS4Gamepad(_FakePad):
+    pass
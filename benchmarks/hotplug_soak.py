@@ -0,0 +1,250 @@
+# hotplug_soak.py
+# 热插拔压力测试：用 pty 模拟串口反复插拔，检查 GamepadManager 是否有资源泄漏。
+#
+# 每个周期：创建 pty 并持续发帧 -> sync_ports 检测波特率并打开 -> 等待虚拟手柄收到 update
+#          -> 关闭 pty 主端（模拟拔出，走读错误 -> connection_lost 的路径）
+#          -> 等待端口被移除 -> sync_ports 扫描
+# 最后检查“先插上、稍后才开始发数据”的已知设备多久能接入。
+# 定期采样 RSS、打开的 fd 数、存活的虚拟手柄数、asyncio 任务数，
+# 任一指标持续增长则以非 0 退出码结束。另外统计重新插入到首帧生效的延迟分布。
+#
+# 仅支持 Linux（依赖 pty 和 /proc）。用法：
+#   python benchmarks/hotplug_soak.py --cycles 5000
+import argparse
+import asyncio
+import gc
+import glob
+import importlib.util
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tty
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# 使用假的 vgamepad 后端，再加载 03 热插拔脚本
+sys.path.insert(0, os.path.join(HERE, "fakes"))
+sys.path.insert(1, ROOT)
+import vgamepad  # noqa: E402  (fakes/vgamepad.py)
+
+
+def load_script(pattern, name):
+    path = glob.glob(os.path.join(ROOT, pattern))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+hotplug = load_script("03*.py", "hotplug_xbox")
+from meps2_cache import DeviceCache  # noqa: E402
+from meps2_calib import CalibrationStore  # noqa: E402
+
+
+def make_frame(lx=128, ly=128, rx=128, ry=128, b3=0, b5=0, b7=0):
+    payload = [lx, b3, ly, b5, rx, b7, ry]
+    return bytes([0xFF, 0x55] + payload + [sum(payload) & 0xFF])
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+async def wait_for(cond, timeout):
+    deadline = time.perf_counter() + timeout
+    while not cond():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.0005)
+    return True
+
+
+async def feed(master, interval=0.005):
+    # 模拟手柄持续发帧（波特率检测需要在监听窗口内收到数据）
+    frame = make_frame(lx=200)
+    while True:
+        try:
+            os.write(master, frame)
+        except OSError:
+            return
+        await asyncio.sleep(interval)
+
+
+def open_pty():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    os.close(slave)
+    return master, path
+
+
+async def one_cycle(manager, timeout):
+    master, path = open_pty()
+    feeder = asyncio.ensure_future(feed(master))
+    try:
+        t0 = time.perf_counter()
+        await manager.sync_ports([path])
+        if path not in manager.active_ports:
+            raise RuntimeError(f"无法打开模拟串口 {path}")
+        pad = manager.active_ports[path][1].pad
+        before = pad.updates
+        if not await wait_for(lambda: pad.updates > before, timeout):
+            raise RuntimeError("等待首帧超时")
+        latency = time.perf_counter() - t0
+    finally:
+        feeder.cancel()
+        try:
+            await feeder
+        except asyncio.CancelledError:
+            pass
+        # 先让设备消失，读取出错后由 connection_lost 移除端口
+        os.close(master)
+
+    if not await wait_for(lambda: path not in manager.active_ports, timeout):
+        raise RuntimeError("等待端口移除超时（connection_lost 未触发）")
+    await manager.sync_ports([])
+    return latency
+
+
+def check_growth(samples, key, tolerance):
+    # 去掉预热阶段，比较前 1/4 与后 1/4 的均值
+    values = [s[key] for s in samples]
+    values = values[len(values) // 4:]
+    if len(values) < 8:
+        return None
+    q = len(values) // 4
+    head = statistics.mean(values[:q])
+    tail = statistics.mean(values[-q:])
+    growth = tail - head
+    if growth > tolerance:
+        return f"{key} 持续增长：{head:.1f} -> {tail:.1f}"
+    return None
+
+
+async def late_start(manager, timeout):
+    """
+    已缓存波特率的设备先插上但不发数据（蓝牙手柄尚未配对），稍后开始发数据，
+    按正常扫描节奏 sync_ports，返回开始发数据到接入的秒数。
+    """
+    master, path = open_pty()
+    manager.baud_cache.set(path, 115200)
+    feeder = None
+    try:
+        await manager.sync_ports([path])
+        if path in manager.active_ports:
+            raise RuntimeError("没有数据的端口不应接入")
+        await asyncio.sleep(hotplug.SCAN_INTERVAL)
+        await manager.sync_ports([path])
+
+        feeder = asyncio.ensure_future(feed(master))
+        t0 = time.perf_counter()
+        while path not in manager.active_ports:
+            if time.perf_counter() - t0 > timeout:
+                raise RuntimeError("开始发数据后未能接入")
+            await asyncio.sleep(hotplug.SCAN_INTERVAL)
+            await manager.sync_ports([path])
+        return time.perf_counter() - t0
+    finally:
+        if feeder is not None:
+            feeder.cancel()
+        os.close(master)
+        await wait_for(lambda: path not in manager.active_ports, 2.0)
+        await manager.sync_ports([])
+
+
+async def soak(args):
+    manager = hotplug.GamepadManager()
+    # 缓存写到临时目录，不影响本机的 ~/.meps2
+    cache_dir = tempfile.mkdtemp(prefix="meps2-soak-")
+    manager.baud_cache = DeviceCache("baudrate", cache_dir)
+    if manager.calibration is not None:
+        manager.calibration = CalibrationStore(DeviceCache("calibration", cache_dir))
+    samples = []
+    latencies = []
+
+    for cycle in range(1, args.cycles + 1):
+        latencies.append(await one_cycle(manager, args.timeout))
+
+        if cycle % args.sample_every == 0:
+            gc.collect()
+            samples.append({
+                "cycle": cycle,
+                "rss_kb": rss_bytes() / 1024.0,
+                "fds": open_fds(),
+                "pads": len(vgamepad.live_pads),
+                "tasks": len(asyncio.all_tasks()),
+            })
+            if args.verbose:
+                print(samples[-1], file=sys.__stdout__)
+
+    # 不检测波特率时端口打开即接入，无需检查
+    late = await late_start(manager, args.late_timeout) if hotplug.AUTO_BAUD else None
+    return samples, latencies, late
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GamepadManager 热插拔压力测试")
+    parser.add_argument("--cycles", type=int, default=2000)
+    parser.add_argument("--sample-every", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--rss-tolerance-kb", type=float, default=4096)
+    parser.add_argument("--late-timeout", type=float, default=5.0,
+                        help="已知设备开始发数据后允许的最长接入时间（秒）")
+    parser.add_argument("--no-auto-baud", action="store_true", help="跳过波特率检测")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.no_auto_baud:
+        hotplug.AUTO_BAUD = False
+
+    # 03 脚本每次插拔都会打印，测试期间丢弃
+    real_stdout = sys.stdout
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            samples, latencies, late = asyncio.run(soak(args))
+        finally:
+            sys.stdout = real_stdout
+
+    ms = [x * 1000 for x in latencies]
+    print(f"周期数: {len(ms)}")
+    print(f"重新插入延迟 ms: p50={percentile(ms, 50):.2f} p90={percentile(ms, 90):.2f} "
+          f"p99={percentile(ms, 99):.2f} max={max(ms):.2f}")
+    if late is not None:
+        print(f"已知设备开始发数据到接入: {late * 1000:.0f} ms")
+    last = samples[-1]
+    print(f"最终: rss={last['rss_kb']:.0f}KB fds={last['fds']} pads={last['pads']} tasks={last['tasks']}")
+
+    failures = [
+        check_growth(samples, "rss_kb", args.rss_tolerance_kb),
+        check_growth(samples, "fds", 0.5),
+        check_growth(samples, "pads", 0.5),
+        check_growth(samples, "tasks", 0.5),
+    ]
+    failures = [f for f in failures if f]
+    if last["pads"] > hotplug.PAD_POOL_SIZE:
+        failures.append(f"存活虚拟手柄 {last['pads']} 超过池大小 {hotplug.PAD_POOL_SIZE}")
+
+    for f in failures:
+        print(f"❌ {f}")
+    if failures:
+        sys.exit(1)
+    print("✅ 未发现资源增长")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# meps2_autobaud.py
+# 自动波特率检测：依次尝试候选波特率，收到校验正确的 0xFF 0x55 帧即锁定
+#
+# Makeblock 7pin、JDY-07、MX-01p 等蓝牙模块出厂波特率不同，猜错时串口能打开但收不到有效帧。
+# 检测结果按设备指纹缓存，之后连接时先试缓存的波特率，通常第一帧就能确认。
+import time
+from collections import namedtuple
+
+import serial
+
+from meps2_cache import DeviceCache
+from meps2_frame import FrameDecoder
+
+# 按常见程度排序
+CANDIDATE_BAUDRATES = (115200, 9600, 57600, 38400, 19200)
+
+# 每个波特率的监听时间（秒）
+LISTEN_WINDOW = 0.15
+
+# baudrate: 检测到的波特率（未检测到为 None）；first_frame: 开始检测到收到第一帧有效数据的秒数；
+# cached: 是否直接命中缓存
+BaudResult = namedtuple("BaudResult", ["baudrate", "first_frame", "cached"])
+
+
+def listen(ser, baudrate, window=LISTEN_WINDOW):
+    """
+    以指定波特率监听一段时间。
+    :return: True 收到有效帧,False 否则
+    """
+    ser.baudrate = baudrate
+    ser.reset_input_buffer()
+    decoder = FrameDecoder()  # 与桥接脚本相同的解码器，跨读取保留半帧
+    deadline = time.monotonic() + window
+    while time.monotonic() < deadline:
+        if decoder.feed(ser.read(ser.in_waiting or 1)):
+            return True
+    return False
+
+
+def detect_baudrate(ser, fingerprint=None, candidates=CANDIDATE_BAUDRATES, cache=None, window=LISTEN_WINDOW):
+    """
+    在已打开的串口上检测波特率。检测结束后串口保持在检测到的波特率。
+    :param ser: serial.Serial 对象
+    :param fingerprint: 设备指纹，用于读写缓存
+    :return: BaudResult
+    """
+    start = time.monotonic()
+    cached = cache.get(fingerprint) if (cache is not None and fingerprint) else None
+
+    old_timeout = ser.timeout
+    ser.timeout = 0.02
+    try:
+        if cached and listen(ser, cached, window):
+            return BaudResult(cached, time.monotonic() - start, True)
+
+        for baudrate in candidates:
+            if baudrate == cached:
+                continue
+            if listen(ser, baudrate, window):
+                if cache is not None and fingerprint:
+                    cache.set(fingerprint, baudrate)
+                return BaudResult(baudrate, time.monotonic() - start, False)
+    finally:
+        ser.timeout = old_timeout
+
+    return BaudResult(None, time.monotonic() - start, False)
+
+
+def probe_port(port, fingerprint=None, candidates=CANDIDATE_BAUDRATES, cache=None, window=LISTEN_WINDOW):
+    """
+    打开串口检测波特率后关闭，供 asyncio 版本在 run_in_executor 中调用。
+    打开时不拉高 DTR/RTS：同一台机器上的 Arduino、ESP 等开发板会因 DTR 翻转而复位。
+    :return: BaudResult
+    """
+    ser = serial.Serial(None, candidates[0], timeout=0.02, rtscts=False, dsrdtr=False)
+    ser.dtr = False
+    ser.rts = False
+    ser.port = port
+    ser.open()
+    try:
+        return detect_baudrate(ser, fingerprint, candidates, cache, window)
+    finally:
+        ser.close()
+
+
+def baud_cache():
+    return DeviceCache("baudrate")
@@ -0,0 +1,66 @@
+# meps2_cache.py
+# 按设备指纹保存在磁盘上的小型缓存（校准数据、波特率等），JSON 格式
+import json
+import os
+import threading
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".meps2")
+
+
+def device_fingerprint(port_info):
+    """
+    由 serial.tools.list_ports 返回的端口信息生成设备指纹。
+    同型号的 USB 转串口芯片往往没有序列号，此时用物理位置区分。
+    :param port_info: ListPortInfo
+    :return: 字符串指纹
+    """
+    if port_info.vid is not None:
+        tail = port_info.serial_number or port_info.location or port_info.device
+        return f"{port_info.vid:04X}:{port_info.pid:04X}:{tail}"
+    return port_info.hwid if port_info.hwid and port_info.hwid != "n/a" else port_info.device
+
+
+def lookup_fingerprint(port):
+    """
+    根据串口名查找设备指纹，找不到时直接返回串口名。
+    """
+    from serial.tools import list_ports
+    for p in list_ports.comports():
+        if p.device == port:
+            return device_fingerprint(p)
+    return port
+
+
+class DeviceCache:
+    def __init__(self, name, directory=CACHE_DIR):
+        """
+        :param name: 缓存名，对应 <directory>/<name>.json
+        """
+        self.path = os.path.join(directory, f"{name}.json")
+        self.entries = None
+        self.lock = threading.Lock()  # 多个端口可能在线程池里同时写
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def get(self, fingerprint, default=None):
+        return self._load().get(fingerprint, default)
+
+    def set(self, fingerprint, value):
+        with self.lock:
+            entries = self._load()
+            entries[fingerprint] = value
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, indent=1, sort_keys=True)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"⚠️ 无法写入缓存 {self.path}: {e}")
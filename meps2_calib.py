@@ -0,0 +1,222 @@
+# meps2_calib.py
+# 每个手柄的输入历史（NumPy 结构化数组环形缓冲）与摇杆自动校准
+#
+# 便宜手柄的摇杆中心各不相同，固定的 v - 128 映射加全局死区无法兼顾。
+# 这里从最近的原始帧中统计中心偏移、噪声范围和最小/最大值，按设备指纹缓存到磁盘，
+# 连接时生成 256 项的摇杆查找表直接用于 handle_frame。
+#
+# NumPy 是可选依赖：未安装时只能使用默认查找表，不记录历史也不校准。
+# numpy 导入较慢，第一次需要时才导入（见 load_numpy），不拖慢启动。
+import time
+
+from meps2_cache import DeviceCache
+
+np = None
+
+
+def load_numpy():
+    """
+    按需导入 numpy。
+    :return: True 可用,False 未安装
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+
+HISTORY_SIZE = 4096
+
+# 原始帧的存储格式：时间戳 + 4 个摇杆 + 3 个按键字节
+FRAME_DTYPE = [
+    ("t", "f8"),
+    ("lx", "u1"), ("ly", "u1"), ("rx", "u1"), ("ry", "u1"),
+    ("b3", "u1"), ("b5", "u1"), ("b7", "u1"),
+]
+AXES = ("lx", "ly", "rx", "ry")
+
+# 判定“静止”的帧：无按键、所有摇杆离 128 不超过 REST_WINDOW，
+# 且处在连续 REST_RUN 帧、相邻帧变化都不超过 REST_STEP 的一段中（轻推摇杆的慢速移动不算静止）
+REST_WINDOW = 24
+REST_STEP = 2
+REST_RUN = 30
+# 至少需要这么多静止帧才更新校准
+MIN_REST_SAMPLES = 200
+# 噪声范围 = NOISE_SIGMAS 倍的稳健标准差 (1.4826 * MAD)，限制在 [1, MAX_NOISE]
+NOISE_SIGMAS = 3
+MAX_NOISE = 12
+# 运行中每写入这么多帧（历史缓冲写满一轮）保存一次校准，进程被直接结束或端口一直不断开时也不会丢
+SAVE_EVERY = HISTORY_SIZE
+# 观测到的行程小于该值时，认为用户没有推满摇杆，保留 0/255 作为端点
+MIN_TRAVEL = 64
+
+
+class InputHistory:
+    def __init__(self, size=HISTORY_SIZE):
+        if not load_numpy():
+            raise RuntimeError("InputHistory 需要安装 numpy")
+        self.data = np.zeros(size, dtype=FRAME_DTYPE)
+        self.size = size
+        self.count = 0  # 累计写入的帧数
+
+    def push(self, frame, t=None):
+        """
+        记录一帧原始数据。
+        :param frame: meps2_frame.Frame
+        """
+        self.data[self.count % self.size] = (
+            time.monotonic() if t is None else t,
+            frame.lx, frame.ly, frame.rx, frame.ry, *frame.button_bytes(),
+        )
+        self.count += 1
+
+    def view(self):
+        """
+        已写入部分的零拷贝视图（按存储顺序，写满后最旧一帧位于 self.head）。
+        """
+        return self.data[:min(self.count, self.size)]
+
+    @property
+    def head(self):
+        return self.count % self.size if self.count > self.size else 0
+
+    def ordered(self):
+        """
+        按时间顺序排列的副本，供分析脚本使用。
+        """
+        if self.count <= self.size:
+            return self.data[:self.count].copy()
+        return np.concatenate((self.data[self.head:], self.data[:self.head]))
+
+
+def rest_mask(axes, buttons):
+    """
+    标出静止的帧：无按键、靠近中心，并且位于足够长的“几乎不动”的连续段中。
+    :param axes: (n, 4) 摇杆值，按时间顺序
+    """
+    near = (buttons == 0) & (np.abs(axes - 128) <= REST_WINDOW).all(axis=1)
+    steady = np.ones(len(axes), dtype=bool)
+    steady[1:] = (np.abs(np.diff(axes, axis=0)) <= REST_STEP).all(axis=1)
+    candidate = near & steady
+
+    # 只保留长度不少于 REST_RUN 的连续段
+    edges = np.diff(np.concatenate(([0], candidate.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    mask = np.zeros(len(axes), dtype=bool)
+    for start, end in zip(starts, ends):
+        if end - start >= REST_RUN:
+            mask[start:end] = True
+    return mask
+
+
+def calibrate(frames):
+    """
+    从原始帧计算摇杆校准参数。
+    :param frames: FRAME_DTYPE 结构化数组，按时间顺序
+    :return: {'center': [...], 'noise': [...], 'min': [...], 'max': [...], 'samples': n}，静止帧不足时返回 None
+    """
+    axes = np.stack([frames[a] for a in AXES], axis=1).astype(np.int16)
+    buttons = frames["b3"] | frames["b5"] | frames["b7"]
+    rest = axes[rest_mask(axes, buttons)]
+    if len(rest) < MIN_REST_SAMPLES:
+        return None
+
+    # 中位数和 MAD 不受少量轻推摇杆的帧影响
+    center = np.median(rest, axis=0)
+    mad = np.median(np.abs(rest - center), axis=0)
+    noise = np.clip(NOISE_SIGMAS * 1.4826 * mad, 1, MAX_NOISE)
+    return {
+        "center": center.tolist(),
+        "noise": noise.tolist(),
+        "min": axes.min(axis=0).tolist(),
+        "max": axes.max(axis=0).tolist(),
+        "samples": int(len(rest)),
+    }
+
+
+def default_axis_lut():
+    """
+    与原来 map_stick 完全一致的查找表：(v - 128) * 256，-128 夹到 -127。
+    """
+    return [max(v - 128, -127) * 256 for v in range(256)]
+
+
+def build_axis_lut(center, noise, lo, hi):
+    """
+    根据校准参数生成 0~255 -> -32767~32767 的查找表，中心附近噪声范围内输出 0。
+    """
+    if hi - center < MIN_TRAVEL:
+        hi = 255
+    if center - lo < MIN_TRAVEL:
+        lo = 0
+    pos_span = max(hi - center - noise, 1)
+    neg_span = max(center - lo - noise, 1)
+
+    lut = []
+    for v in range(256):
+        d = v - center
+        if abs(d) <= noise:
+            out = 0
+        elif d > 0:
+            out = (d - noise) / pos_span * 32767
+        else:
+            out = (d + noise) / neg_span * 32767
+        lut.append(int(max(-32767, min(32767, out))))
+    return lut
+
+
+class CalibrationStore:
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else DeviceCache("calibration")
+
+    def calibrated(self, fingerprint):
+        """
+        该设备是否已有校准结果（没有时桥接脚本可以保留自己的默认映射）。
+        """
+        return bool(fingerprint) and bool(self.cache.get(fingerprint))
+
+    def axis_luts(self, fingerprint):
+        """
+        连接时调用：返回 LX, LY, RX, RY 四张查找表，没有缓存时使用默认映射。
+        """
+        cal = self.cache.get(fingerprint) if fingerprint else None
+        if not cal:
+            lut = default_axis_lut()
+            return [lut, lut, lut, lut]
+        return [
+            build_axis_lut(cal["center"][i], cal["noise"][i], cal["min"][i], cal["max"][i])
+            for i in range(4)
+        ]
+
+    def new_history(self):
+        return InputHistory() if load_numpy() else None
+
+    def refresh(self, fingerprint, history):
+        """
+        每帧 push 之后调用：累计写入 SAVE_EVERY 帧时更新一次校准（新的查找表下次连接时生效）。
+        """
+        if history is not None and history.count % SAVE_EVERY == 0:
+            return self.update(fingerprint, history)
+        return None
+
+    def update(self, fingerprint, history):
+        """
+        断开、退出或定期保存时调用：根据本次会话的历史重新计算校准并写入缓存。
+        行程范围与缓存合并（只扩大不缩小），一次没推满摇杆的短会话不会缩小范围。
+        """
+        if history is None or not fingerprint or not load_numpy():
+            return None
+        cal = calibrate(history.ordered())
+        if cal is None:
+            return None
+        old = self.cache.get(fingerprint)
+        if old:
+            cal["min"] = [min(a, b) for a, b in zip(cal["min"], old["min"])]
+            cal["max"] = [max(a, b) for a, b in zip(cal["max"], old["max"])]
+        self.cache.set(fingerprint, cal)
+        return cal
@@ -0,0 +1,115 @@
+# meps2_dashboard.py
+# 控制台实时面板：在独立线程里以固定的低刷新率重绘每个手柄的状态表
+#
+# 解析帧的路径只更新几个属性，从不等待终端 I/O；面板线程定时读取这些属性并整屏重绘，
+# 代替逐帧 print。
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from meps2_frame import PS2_BUTTONS
+
+# 刷新率（次/秒）
+REFRESH_RATE = 5
+
+# 面板读取的状态：累计帧数、累计错误数、最后一帧时间 (time.monotonic，0 表示还没有帧)、
+# 4 个摇杆原始值、按下的按键名、因积压跳过的帧数
+Status = namedtuple("Status", ["frames", "errors", "timestamp", "axes", "pressed", "drained"])
+
+
+def protocol_source(protocol):
+    """
+    asyncio 协议对象（03/04 脚本）的状态读取函数。
+    """
+    def read():
+        frame = protocol.last_frame
+        if frame is None:
+            axes, pressed = (128, 128, 128, 128), ()
+        else:
+            axes = frame[:4]
+            pressed = tuple(name for name, bit in PS2_BUTTONS.items() if frame.buttons & bit)
+        backlog = protocol.backlog
+        return Status(protocol.frame_count, protocol.checksum_errors, backlog.last_frame_time, axes, pressed,
+                      backlog.drained_frames)
+    return read
+
+
+def meps2_source(ps2):
+    """
+    MePS2（01 脚本，需先 start_reader）的状态读取函数。
+    """
+    def read():
+        snap = ps2.snapshot
+        data = snap.data
+        axes = (data['LX'], data['LY'], data['RX'], data['RY'])
+        pressed = tuple(k for k, v in data.items() if v is True)
+        return Status(snap.seq, ps2.checksum_errors, snap.timestamp if snap.seq else 0, axes, pressed, 0)
+    return read
+
+
+class Dashboard:
+    def __init__(self, refresh_rate=REFRESH_RATE, stream=None):
+        self.interval = 1.0 / refresh_rate
+        self.stream = stream or sys.stdout
+        self.sources = {}  # name -> 状态读取函数
+        self.prev = {}     # name -> (帧数, 时间)，用于计算帧率
+        self.thread = None
+        self.running = False
+
+    def add(self, name, source):
+        self.sources[name] = source
+
+    def remove(self, name):
+        self.sources.pop(name, None)
+
+    def start(self):
+        if self.thread is not None:
+            return
+        if os.name == "nt":
+            os.system("")  # 打开 Windows 控制台的 ANSI 转义支持
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="MePS2-dashboard", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def _run(self):
+        while self.running:
+            started = time.monotonic()
+            try:
+                self.stream.write("\x1b[H\x1b[J" + self.render(started))
+                self.stream.flush()
+            except Exception:
+                pass
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def render(self, now):
+        lines = [f"{'手柄':<12} {'LX':>3} {'LY':>3} {'RX':>3} {'RY':>3} {'帧率':>6} {'错误':>5} {'丢弃':>5} {'延迟ms':>7}  按键"]
+        sources = dict(self.sources)  # 其他线程可能同时增删
+        for name in sorted(sources):
+            try:
+                st = sources[name]()
+            except Exception:
+                continue
+
+            fps = 0.0
+            prev = self.prev.get(name)
+            if prev is not None and now > prev[1]:
+                fps = (st.frames - prev[0]) / (now - prev[1])
+            self.prev[name] = (st.frames, now)
+
+            age = f"{(now - st.timestamp) * 1000:7.0f}" if st.timestamp else f"{'-':>7}"
+            lx, ly, rx, ry = st.axes
+            lines.append(
+                f"{name:<12} {lx:>3} {ly:>3} {rx:>3} {ry:>3} {fps:>6.1f} {st.errors:>5} {st.drained:>5} {age}  {' '.join(st.pressed)}"
+            )
+        for name in list(self.prev):
+            if name not in sources:
+                del self.prev[name]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,237 @@
+# meps2_events.py
+# 按键/摇杆边沿事件：比较相邻两帧，产生带时间戳的按下、松开和摇杆越过阈值事件
+#
+# 帧记录中的 24 位按键掩码 (b3 | b5 << 8 | b7 << 16) 与上一帧异或即得变化的按键，
+# 比轮询 button_pressed 更省 CPU，也不会漏掉比轮询间隔更短的按键。
+#
+# 事件通过 EventHub 分发，每个订阅者有自己的有界队列，满了丢弃最旧的事件，
+# 慢的订阅者不会拖住解析线程：
+#   async for ev in hub.subscribe(): ...      asyncio 中逐个等待事件
+#   hub.add_callback(func)                    在独立线程中逐个回调 func(ev)
+import asyncio
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from meps2_frame import NEUTRAL, PS2_BUTTONS
+
+# 每个订阅者最多缓存的事件数
+QUEUE_SIZE = 256
+
+# 摇杆离中心超过该值进入 -1 / +1 区，回到 AXIS_RELEASE 以内才回到 0 区（滞回，避免抖动）
+AXIS_THRESHOLD = 64
+AXIS_RELEASE = 48
+
+# 摇杆名，顺序与 Frame 的前 4 个字段一致
+AXES = ("LX", "LY", "RX", "RY")
+
+# 24 位掩码中的位 -> 按键名
+BUTTON_BITS = {bit: name for name, bit in PS2_BUTTONS.items()}
+
+# timestamp: time.monotonic；source: 端口名；kind: 'press' / 'release' / 'axis'；
+# name: 按键名或摇杆名；value: 按键为 True/False，摇杆为所在区 -1 / 0 / 1
+EdgeEvent = namedtuple("EdgeEvent", ["timestamp", "source", "kind", "name", "value"])
+
+
+class EdgeDetector:
+    def __init__(self, source, threshold=AXIS_THRESHOLD, release=AXIS_RELEASE):
+        self.source = source
+        self.threshold = threshold
+        self.release = release
+        self.mask = 0
+        self.zones = [0, 0, 0, 0]
+
+    def feed(self, frame, t=None):
+        """
+        送入一帧 meps2_frame.Frame。
+        :return: 与上一帧相比产生的事件列表（没有变化时为空列表）
+        """
+        events = []
+        if t is None:
+            t = time.monotonic()
+
+        mask = frame.buttons
+        changed = mask ^ self.mask
+        self.mask = mask
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            name = BUTTON_BITS.get(bit)
+            if name is not None:
+                pressed = (mask & bit) != 0
+                events.append(EdgeEvent(t, self.source, "press" if pressed else "release", name, pressed))
+
+        zones = self.zones
+        for i, name in enumerate(AXES):
+            d = frame[i] - 128
+            zone = zones[i]
+            if zone and d * zone > self.release:
+                pass  # 仍在原来的区内
+            elif d >= self.threshold:
+                zone = 1
+            elif d <= -self.threshold:
+                zone = -1
+            else:
+                zone = 0
+            if zone != zones[i]:
+                zones[i] = zone
+                events.append(EdgeEvent(t, self.source, "axis", name, zone))
+        return events
+
+    def release_all(self, t=None):
+        """
+        断开时调用：为仍按着的按键和偏离中心的摇杆补发松开 / 回中事件。
+        """
+        return self.feed(NEUTRAL, t)
+
+
+class EventSubscription:
+    """
+    asyncio 订阅：async for 逐个取事件，close() 后迭代结束。
+    """
+    def __init__(self, hub, maxsize, loop):
+        self.hub = hub
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.closed = False
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def deliver(self, events):
+        if self.closed:
+            return
+        try:
+            same_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            same_loop = False
+        try:
+            if same_loop:
+                for event in events:
+                    self._put(event)
+            else:
+                # 解析在其他线程（如 MePS2 读取线程）时，转交给订阅者所在的事件循环
+                self.loop.call_soon_threadsafe(self._deliver_all, events)
+        except RuntimeError:
+            # 订阅者的事件循环已关闭
+            self.close()
+
+    def _deliver_all(self, events):
+        for event in events:
+            self._put(event)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.hub.unsubscribe(self)
+            try:
+                self.loop.call_soon_threadsafe(self._put, None)
+            except RuntimeError:
+                pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+class CallbackSubscription:
+    """
+    线程回调订阅：独立线程从有界队列中取事件并调用 callback(event)。
+    """
+    def __init__(self, hub, callback, maxsize):
+        self.hub = hub
+        self.callback = callback
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="MePS2-events", daemon=True)
+        self.thread.start()
+
+    def deliver(self, events):
+        if self.closed:
+            return
+        for event in events:
+            while True:
+                try:
+                    self.queue.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            try:
+                self.callback(event)
+            except Exception as e:
+                print(f"⚠️ 事件回调出错: {e}")
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.hub.unsubscribe(self)
+            while True:
+                try:
+                    self.queue.put_nowait(None)
+                    break
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+
+class EventHub:
+    def __init__(self):
+        self.subscribers = ()  # 发布时只读一次引用，增删时整体替换，无需加锁
+        self.lock = threading.Lock()
+
+    def subscribe(self, maxsize=QUEUE_SIZE):
+        """
+        在当前事件循环中订阅事件，返回可 async for 的 EventSubscription。
+        """
+        sub = EventSubscription(self, maxsize, asyncio.get_running_loop())
+        self._add(sub)
+        return sub
+
+    def add_callback(self, callback, maxsize=QUEUE_SIZE):
+        """
+        注册回调，在独立线程中调用 callback(event)。返回 CallbackSubscription，close() 取消。
+        """
+        sub = CallbackSubscription(self, callback, maxsize)
+        self._add(sub)
+        return sub
+
+    def _add(self, sub):
+        with self.lock:
+            self.subscribers = self.subscribers + (sub,)
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not sub)
+
+    def publish(self, events):
+        if not events:
+            return
+        for sub in self.subscribers:
+            sub.deliver(events)
+
+    def close(self):
+        for sub in self.subscribers:
+            sub.close()
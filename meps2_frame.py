@@ -0,0 +1,159 @@
+# meps2_frame.py
+# MePS2 帧解码：收字节时累加校验和，校验通过时一步生成不可变的帧记录
+#
+# 帧格式：0xFF 0x55 LX b3 LY b5 RX b7 RY checksum，checksum = 7 个数据字节之和的低 8 位。
+# 解码出的 Frame 与解析器的状态无关，后续环节（积压处理、历史记录、帧流、事件）可以直接持有，
+# 不需要复制，也不会被下一块数据覆盖。
+import time
+from collections import namedtuple
+
+FRAME_SIZE = 10
+
+# 积压检测：一块数据里最旧一帧估计滞后超过该秒数时，只应用最新一帧（按键变化仍逐个送出）
+BACKLOG_LAG = 0.03
+
+# 按键在 Frame.buttons（24 位掩码：b3 | b5 << 8 | b7 << 16）中的位
+PS2_BUTTONS = {
+    "R1": 0x000001, "R2": 0x000002, "L1": 0x000004, "L2": 0x000008,
+    "MODE": 0x000010, "BUTTON_L": 0x000020,
+    "TRIANGLE": 0x000100, "XSHAPED": 0x000200, "SQUARE": 0x000400,
+    "ROUND": 0x000800, "START": 0x001000,
+    "UP": 0x010000, "DOWN": 0x020000, "LEFT": 0x040000, "RIGHT": 0x080000,
+    "SELECT": 0x100000, "BUTTON_R": 0x200000,
+}
+
+
+class Frame(namedtuple("Frame", ["lx", "ly", "rx", "ry", "buttons"])):
+    """
+    一帧已通过校验的数据：4 个摇杆原始值 (0~255) 和 24 位按键掩码。
+    """
+    __slots__ = ()
+
+    def button_bytes(self):
+        """
+        还原帧中的 3 个按键字节 (b3, b5, b7)。
+        """
+        b = self.buttons
+        return b & 0xFF, (b >> 8) & 0xFF, b >> 16
+
+
+# 无按键、摇杆居中
+NEUTRAL = Frame(0x80, 0x80, 0x80, 0x80, 0)
+
+
+class FrameDecoder:
+    def __init__(self):
+        self.prev = 0
+        self.index = 0          # 0: 寻找帧头；2~9: 下一个字节在帧中的位置
+        self.fields = [0] * 7   # LX b3 LY b5 RX b7 RY
+        self.checksum = 0
+        self.checksum_errors = 0
+
+    def reset(self):
+        """
+        丢弃未完成的半帧（超时后重新同步）。
+        """
+        self.prev = 0
+        self.index = 0
+
+    def feed(self, data):
+        """
+        送入一块原始字节（bytes 或 int 序列）。
+        :return: 本块中校验通过的 Frame 列表
+        """
+        frames = []
+        prev = self.prev
+        index = self.index
+        checksum = self.checksum
+        fields = self.fields
+        for c in data:
+            if index:
+                if index < 9:
+                    fields[index - 2] = c
+                    checksum += c
+                    index += 1
+                    continue
+                # 第 10 个字节是校验和
+                if (checksum & 0xFF) == c:
+                    lx, b3, ly, b5, rx, b7, ry = fields
+                    frames.append(Frame(lx, ly, rx, ry, b3 | (b5 << 8) | (b7 << 16)))
+                    prev = c
+                else:
+                    self.checksum_errors += 1
+                    prev = 0
+                index = 0
+            elif c == 0x55 and prev == 0xFF:
+                index = 2
+                checksum = 0
+            else:
+                prev = c
+        self.prev = prev
+        self.index = index
+        self.checksum = checksum
+        return frames
+
+
+class FrameBacklog:
+    """
+    积压处理：刚打开端口或事件循环卡顿后，系统缓冲区里会堆积旧帧，逐帧回放只会让手柄越来越滞后。
+    此时只应用最新一帧，中间帧只保留按键变化（摇杆直接取最新值），不丢任何按键。
+    """
+    def __init__(self, lag=BACKLOG_LAG):
+        self.lag = lag
+        self.byte_time = 10.0 / 115200   # 8N1 每字节 10 bit
+        self.frame_interval = 0.0        # 设备发帧间隔（平滑估计）
+        self.last_frame_time = 0.0
+        self.first_frame_time = 0.0      # 第一帧的时间，用于统计启动耗时
+        self.last_buttons = 0
+        self.drained_frames = 0          # 因积压被跳过的帧数
+        self.backlog_events = 0
+
+    def connection_made(self, transport):
+        """
+        按串口实际波特率估计每字节耗时。
+        """
+        try:
+            self.byte_time = 10.0 / transport.serial.baudrate
+        except (AttributeError, TypeError, ZeroDivisionError):
+            pass
+
+    def select(self, frames, nbytes):
+        """
+        从一块数据解析出的帧中选出需要应用的帧。
+        :param frames: 本块的 Frame 列表
+        :param nbytes: 本块的字节数
+        :return: 按顺序应用的 Frame 列表
+        """
+        if not frames:
+            return frames
+        now = time.monotonic()
+        n = len(frames)
+        if n == 1 and self.last_frame_time:
+            dt = now - self.last_frame_time
+            self.frame_interval = dt if not self.frame_interval else self.frame_interval * 0.9 + dt * 0.1
+        self.last_frame_time = now
+        if not self.first_frame_time:
+            self.first_frame_time = now
+
+        # 最旧一帧的滞后：按设备发帧间隔和链路速率分别估计，取较大者
+        lag = max((n - 1) * self.frame_interval, nbytes * self.byte_time)
+        if n > 1 and lag > self.lag:
+            self.backlog_events += 1
+            latest = frames[-1]
+            selected = []
+            buttons = self.last_buttons
+            for frame in frames[:-1]:
+                if frame.buttons != buttons:
+                    buttons = frame.buttons
+                    selected.append(latest._replace(buttons=buttons))
+                else:
+                    self.drained_frames += 1
+            if selected and selected[-1].buttons == latest.buttons:
+                # 最后一次按键变化与最新一帧相同，由最新一帧送出即可
+                selected.pop()
+                self.drained_frames += 1
+            selected.append(latest)
+            frames = selected
+
+        self.last_buttons = frames[-1].buttons
+        return frames
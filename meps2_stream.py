@@ -0,0 +1,184 @@
+# meps2_stream.py
+# 本地帧流服务：把手柄状态以紧凑二进制包转发给本机其他程序（模拟器、测试台等）
+#
+# 用法：
+#   streamer = FrameStreamer(("127.0.0.1", 47800))   # UDP
+#   streamer = FrameStreamer("/tmp/meps2.sock")       # Unix 数据报（非 Windows）
+#   streamer.add_subscriber(("127.0.0.1", 47801))
+#   ... 在 handle_frame 里调用 streamer.publish(port_name, frame)
+#
+# 订阅者也可以直接向服务地址发送 b"SUB" / b"UNSUB" 自行注册或注销。
+import asyncio
+import os
+import socket
+import stat
+import struct
+
+# 包头：magic(2) 版本(1) 记录数(1) 序号(4)
+HEADER = struct.Struct("<2sBBI")
+MAGIC = b"MP"
+VERSION = 1
+
+# 每个手柄一条记录：槽位(1) LX LY RX RY(4) 按键字节 b3 b5 b7(3)
+RECORD = struct.Struct("<8B")
+
+MSG_SUBSCRIBE = b"SUB"
+MSG_UNSUBSCRIBE = b"UNSUB"
+
+
+def unpack_packet(data):
+    """
+    解析一个数据报，供订阅端使用。
+    :param data: 收到的 bytes
+    :return: (序号, [(槽位, LX, LY, RX, RY, b3, b5, b7), ...])
+    """
+    magic, version, count, seq = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a MePS2 stream packet")
+    records = [RECORD.unpack_from(data, HEADER.size + i * RECORD.size) for i in range(count)]
+    return seq, records
+
+
+def remove_stale_socket(path):
+    """
+    删除上次运行遗留的 Unix 套接字文件（进程被强制结束时不会清理），否则 bind 会失败。
+    只删除套接字类型的文件。
+    """
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except OSError:
+        pass
+
+
+class FrameStreamer:
+    def __init__(self, bind):
+        """
+        :param bind: (host, port) 使用 UDP；字符串路径使用 Unix 数据报套接字
+        """
+        if isinstance(bind, str):
+            self.family = socket.AF_UNIX
+        else:
+            self.family = socket.AF_INET
+        self.sock = socket.socket(self.family, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)  # 订阅者慢时直接丢包，绝不阻塞串口读取
+        if self.family == socket.AF_UNIX:
+            remove_stale_socket(bind)
+        self.sock.bind(bind)
+        self.bind = bind
+
+        self.subscribers = set()
+        self.slots = {}      # port_name -> 槽位号（稳定分配）
+        self.pending = {}    # 槽位 -> 本轮最新记录，同一轮内新帧覆盖旧帧
+        self.last = {}       # 槽位 -> 上次发送的记录，没有变化的手柄不再发送
+        self.seq = 0
+        self.flush_scheduled = False
+
+        # 统计
+        self.sent_packets = 0
+        self.dropped_packets = 0
+
+        # Windows 的 Proactor 事件循环不支持 add_reader，此时只能用 add_subscriber 注册
+        self.loop = asyncio.get_running_loop()
+        try:
+            self.loop.add_reader(self.sock.fileno(), self._on_readable)
+            self.reader_added = True
+        except NotImplementedError:
+            self.reader_added = False
+
+    def add_subscriber(self, addr):
+        self.subscribers.add(addr)
+        self.last.clear()  # 新订阅者需要收到每个手柄的当前状态
+
+    def remove_subscriber(self, addr):
+        self.subscribers.discard(addr)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(64)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if not addr:
+                # 未绑定地址的 Unix 客户端无法回发
+                continue
+            if data == MSG_SUBSCRIBE:
+                self.add_subscriber(addr)
+            elif data == MSG_UNSUBSCRIBE:
+                self.remove_subscriber(addr)
+
+    def publish(self, port_name, frame):
+        """
+        记录一个手柄的最新状态。同一轮事件循环内所有变化的手柄合并成一个包发送。
+        :param port_name: 串口名，用于分配稳定槽位
+        :param frame: meps2_frame.Frame
+        """
+        slot = self.slots.get(port_name)
+        if slot is None:
+            slot = len(self.slots) & 0xFF
+            self.slots[port_name] = slot
+
+        b3, b5, b7 = frame.button_bytes()
+        record = RECORD.pack(slot, frame.lx, frame.ly, frame.rx, frame.ry, b3, b5, b7)
+        if self.last.get(slot) == record:
+            # 与上次发送的相同；本轮之前若有变化则用这一帧覆盖回去
+            if slot in self.pending:
+                self.pending[slot] = record
+            return
+        self.pending[slot] = record
+
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.loop.call_soon(self.flush)
+
+    def flush(self):
+        self.flush_scheduled = False
+        if not self.pending:
+            return
+
+        records = list(self.pending.values())
+        self.pending.clear()
+        if not self.subscribers:
+            return
+        for record in records:
+            self.last[record[0]] = record
+
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        # 一个包最多 255 条记录
+        for i in range(0, len(records), 255):
+            chunk = records[i:i + 255]
+            parts = [HEADER.pack(MAGIC, VERSION, len(chunk), self.seq)] + chunk
+            self._send(parts)
+
+    def _send(self, parts):
+        # sendmsg 以分散缓冲一次系统调用发出整个包；Windows 没有 sendmsg，退回到拼接后 sendto
+        payload = None
+        for addr in list(self.subscribers):
+            try:
+                if hasattr(self.sock, "sendmsg"):
+                    self.sock.sendmsg(parts, (), 0, addr)
+                else:
+                    if payload is None:
+                        payload = b"".join(parts)
+                    self.sock.sendto(payload, addr)
+                self.sent_packets += 1
+            except (BlockingIOError, InterruptedError):
+                # 发送缓冲区满：订阅者太慢，丢弃本包
+                self.dropped_packets += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # 订阅者已退出
+                self.subscribers.discard(addr)
+            except OSError:
+                self.dropped_packets += 1
+
+    def close(self):
+        if self.reader_added:
+            self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        if self.family != socket.AF_INET:
+            try:
+                os.unlink(self.bind)
+            except OSError:
+                pass